@@ -0,0 +1,119 @@
+"""Backtest das estratégias de geração de chaves sobre o histórico
+
+    python backtest.py --start 50 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from logic import build_analysis_state, apply_draws, generate_keys_from_state
+from combination_search import PROFILES
+from storage import as_draws, load_history
+
+# O servidor é multi-thread: um fork herdaria bloqueios (métricas, logging) detidos por outras threads
+POOL_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'draws.npy')
+
+# Escalões de prémios do Euromilhões: (números certos, estrelas certas) -> escalão (1 = jackpot)
+PRIZE_TIERS = {
+    (5, 2): 1, (5, 1): 2, (5, 0): 3, (4, 2): 4, (4, 1): 5, (3, 2): 6, (4, 0): 7,
+    (2, 2): 8, (3, 1): 9, (3, 0): 10, (1, 2): 11, (2, 1): 12, (2, 0): 13,
+}
+
+def score_key(key, numbers, stars):
+    """(números certos, estrelas certas) de uma chave contra um sorteio"""
+    return len(set(key['numbers']) & set(numbers)), len(set(key['stars']) & set(stars))
+
+def _replay_chunk(draws, start, end, recent_window=30):
+    """Repete os sorteios [start, end): chaves geradas só com os anteriores, pontuadas contra o seguinte"""
+    state = build_analysis_state(draws[:start], recent_window)
+    matrices, skipped = {}, 0
+    for position in range(start, end):
+        keys = generate_keys_from_state(state)
+        if keys:
+            numbers, stars = draws['numbers'][position].tolist(), draws['stars'][position].tolist()
+            for name, key in keys.items():
+                number_hits, star_hits = score_key(key, numbers, stars)
+                matrix = matrices.setdefault(name, np.zeros((6, 3), dtype=np.int64))
+                matrix[number_hits, star_hits] += 1
+        else:
+            skipped += 1
+        state = apply_draws(state, draws[position:position + 1])
+    return matrices, skipped
+
+def strategy_name(name):
+    """Nome no relatório: chaves com o mesmo nome de um perfil da pesquisa exaustiva levam o sufixo -greedy"""
+    # O backtest repete o motor greedy; no dashboard (EUROMILHOES_KEY_ENGINE=search) estes nomes são as chaves da pesquisa
+    return f'{name}-greedy' if name in PROFILES else name
+
+def summarize(matrix):
+    """Distribuições de acertos e contagem por escalão a partir da matriz 6x3 de (números, estrelas)"""
+    total = int(matrix.sum())
+    tiers = {str(tier): int(matrix[hits]) for hits, tier in sorted(PRIZE_TIERS.items(), key=lambda item: item[1])}
+    winning = sum(tiers.values())
+    return {
+        'keys': total,
+        'hitMatrix': matrix.tolist(),
+        'numberHits': matrix.sum(axis=1).tolist(),
+        'starHits': matrix.sum(axis=0).tolist(),
+        'tiers': tiers,
+        'winningKeys': winning,
+        'winRate': round(winning / total, 4) if total else 0,
+        'bestTier': min((int(tier) for tier, count in tiers.items() if count), default=None),
+    }
+
+def run_backtest(draws, start=50, end=None, workers=None, recent_window=30):
+    """Backtest em blocos contíguos por processo; cada bloco constrói o estado uma vez e avança incrementalmente"""
+    draws = np.array(as_draws(draws))
+    end = len(draws) if end is None else min(end, len(draws))
+    start = max(1, start)
+    started = time.perf_counter()
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, cpus))
+    steps = max(0, end - start)
+    bounds = np.linspace(start, end, min(workers, steps) + 1, dtype=np.int64).tolist() if steps else []
+    chunks = list(zip(bounds[:-1], bounds[1:]))
+
+    matrices, skipped = {}, 0
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=POOL_CONTEXT) as pool:
+            futures = [pool.submit(_replay_chunk, draws, lo, hi, recent_window) for lo, hi in chunks]
+            results = [future.result() for future in futures]
+    else:
+        results = [_replay_chunk(draws, lo, hi, recent_window) for lo, hi in chunks]
+    for chunk_matrices, chunk_skipped in results:
+        skipped += chunk_skipped
+        for name, matrix in chunk_matrices.items():
+            matrices[name] = matrices.get(name, 0) + matrix
+
+    return {
+        'start': start,
+        'end': end,
+        'draws': steps,
+        'skipped': skipped,
+        'workers': len(chunks),
+        'elapsedSeconds': round(time.perf_counter() - started, 3),
+        'keyEngine': 'greedy',
+        'strategies': {strategy_name(name): summarize(matrices[name]) for name in sorted(matrices)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--store', default=DEFAULT_STORE, help='Snapshot de sorteios (data/draws.npy)')
+    parser.add_argument('--start', type=int, default=50, help='Primeiro sorteio pontuado (os anteriores só aquecem o estado)')
+    parser.add_argument('--end', type=int, help='Último sorteio (exclusivo)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    draws = load_history(args.store)
+    if draws is None or len(draws) == 0:
+        parser.error(f"Sem sorteios em {args.store} - execute primeiro o dashboard para obter o histórico")
+    print(json.dumps(run_backtest(draws, args.start, args.end, args.workers), indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())
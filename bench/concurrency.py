@@ -0,0 +1,95 @@
+"""Teste de carga concorrente do cache de /api/analysis: muitas threads, um só cálculo por versão dos dados
+
+    python -m bench.concurrency --threads 32 --requests 20 --rounds 3
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import main
+from bench.suite import isolated_data_dir, reset_api_caches
+
+RESULTS = ('hit', 'miss', 'coalesced', 'shared', 'stale')
+
+def cache_counters():
+    return {result: main.ANALYSIS_CACHE_REQUESTS.value(result=result) for result in RESULTS}
+
+def hammer(threads, requests):
+    """`threads` clientes arrancam em simultâneo e fazem `requests` pedidos cada um"""
+    barrier = threading.Barrier(threads)
+    statuses, etags, latencies = [], set(), []
+    lock = threading.Lock()
+
+    def client_loop():
+        client = main.app.test_client()
+        barrier.wait()
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get('/api/analysis')
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses.append(response.status_code)
+                etags.add(response.headers.get('ETag'))
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=client_loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    return {
+        'requests': len(statuses),
+        'errors': sum(1 for status in statuses if status != 200),
+        'etags': len(etags),
+        'p50Ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'maxMs': round(latencies[-1] * 1000, 3),
+    }
+
+def wait_for_revalidation(timeout=60):
+    """Espera que a thread de revalidação deixe o cache na versão atual"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if main._is_cache_valid(main.analysis_snapshot(), main.current_data_version()):
+            return True
+        time.sleep(0.05)
+    return False
+
+def run(threads, requests, rounds, size):
+    report = {'threads': threads, 'requestsPerThread': requests, 'rounds': []}
+    ok = True
+    with isolated_data_dir():
+        reset_api_caches()
+        for round_number in range(rounds):
+            # Cada ronda muda os dados: a primeira parte de um cache vazio (todos esperam pelo mesmo
+            # cálculo), as seguintes têm uma versão anterior para servir enquanto se recalcula
+            main.save_cache(main.get_simulated_data(size + round_number, seed=round_number))
+            before = cache_counters()
+            result = hammer(threads, requests)
+            revalidated = wait_for_revalidation()
+            after = cache_counters()
+            result['cache'] = {name: after[name] - before[name] for name in RESULTS}
+            result['computations'] = result['cache']['miss']
+            result['revalidated'] = revalidated
+            round_ok = result['errors'] == 0 and result['computations'] == 1 and revalidated
+            result['ok'] = round_ok
+            ok = ok and round_ok
+            report['rounds'].append(result)
+    report['ok'] = ok
+    return report
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=20, help='Pedidos por thread em cada ronda')
+    parser.add_argument('--rounds', type=int, default=3, help='Número de versões dos dados a testar')
+    parser.add_argument('--size', type=int, default=1868, help='Sorteios do histórico sintético')
+    args = parser.parse_args()
+
+    report = run(args.threads, args.requests, args.rounds, args.size)
+    print(json.dumps(report, indent=2))
+    return 0 if report['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
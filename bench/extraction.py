@@ -0,0 +1,61 @@
+"""Micro-benchmark da extração de uma página de ano por modo: comandos WebDriver e tempo
+
+    python -m bench.extraction --year 2024 --modes elements,script,page_source
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from datetime import date
+from bench.fixtures import FixtureServer
+from logic import EuromilhoesParser, EXTRACTION_MODES, setup_headless_chrome_linux
+
+def count_commands(driver):
+    """Conta os comandos enviados ao chromedriver (WebElement também passa por driver.execute)"""
+    counter = Counter()
+    execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counter[driver_command] += 1
+        return execute(driver_command, params)
+
+    driver.execute = counting_execute
+    return counter
+
+def measure(parser, year, repeat):
+    counter = count_commands(parser.driver)
+    timings, draws = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        draws = parser.extract_year(year)
+        timings.append(time.perf_counter() - started)
+    commands = sum(counter.values()) / repeat
+    return {
+        'draws': len(draws),
+        'webdriverCallsPerYear': commands,
+        'bestSeconds': round(min(timings), 4),
+        'commands': {name: count / repeat for name, count in counter.most_common()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default=','.join(EXTRACTION_MODES))
+    parser.add_argument('--chrome', help='Binário do Chrome (por omissão usa setup_headless_chrome_linux)')
+    parser.add_argument('--year', type=int, default=date.today().year - 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    chrome_binary_path = args.chrome or setup_headless_chrome_linux()
+    results = {}
+    with FixtureServer(args.year, args.year) as server:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            scraper = EuromilhoesParser(chrome_binary_path, reuse_browser=False, base_url=server.url, extraction=mode)
+            try:
+                results[mode] = measure(scraper, args.year, args.repeat)
+            finally:
+                scraper.close()
+
+    print(json.dumps({'year': args.year, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Páginas results-history sintéticas e servidor HTTP local para benchmarks offline"""
+import hashlib
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIRST_DRAW = date(2004, 2, 13)
+TUESDAY_DRAWS_START = date(2011, 5, 10)
+
+def draw_dates(year, today=None):
+    """Datas de sorteio de um ano (sextas; também terças desde maio de 2011)"""
+    today = today or date.today()
+    day = max(date(year, 1, 1), FIRST_DRAW)
+    end = min(date(year, 12, 31), today)
+    while day <= end:
+        if day.weekday() == 4 or (day.weekday() == 1 and day >= TUESDAY_DRAWS_START):
+            yield day
+        day += timedelta(days=1)
+
+def render_year_page(year, seed=0):
+    """HTML com a mesma estrutura de #resultsTable do site (sorteio mais recente primeiro)"""
+    rng = random.Random(f"{seed}-{year}")
+    rows = []
+    for day in draw_dates(year):
+        numbers = sorted(rng.sample(range(1, 51), 5))
+        stars = sorted(rng.sample(range(1, 13), 2))
+        balls = ''.join(f'<li class="resultBall ball">{n}</li>' for n in numbers)
+        balls += ''.join(f'<li class="resultBall lucky-star">{s}</li>' for s in stars)
+        rows.append(
+            f'<tr class="resultRow"><td class="date"><a href="/results/{day:%d-%m-%Y}">'
+            f'{day:%A}<br>{day:%d %B %Y}</a></td>'
+            f'<td><ul class="balls">{balls}</ul></td></tr>'
+        )
+    rows.reverse()
+    return (
+        f'<!DOCTYPE html><html><head><title>EuroMillions Results History {year}</title></head><body>'
+        f'<table id="resultsTable"><tbody>{"".join(rows)}</tbody></table></body></html>'
+    )
+
+class FixtureServer:
+    """Servidor local que serve /results-history-{ano} com latência artificial opcional e ETag/304"""
+
+    def __init__(self, start_year=2004, end_year=None, latency=0.0, seed=0, pages=None):
+        end_year = end_year or date.today().year
+        self.pages = pages or {
+            f'/results-history-{year}': render_year_page(year, seed).encode('utf-8')
+            for year in range(start_year, end_year + 1)
+        }
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.pages.get(self.path.split('?')[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
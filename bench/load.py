@@ -0,0 +1,233 @@
+"""Teste de carga da API num servidor real, com o site de resultados servido localmente
+
+    python -m bench.load --size 10000000 --concurrency 16 --duration 30 --update-every 10
+
+O servidor corre num processo à parte, sobre um diretório de dados temporário com um histórico
+sintético de --size sorteios. A fase 'analysis' só faz GET /api/analysis; a fase 'mixed' junta
+POST /api/update a cada --update-every segundos. A primeira atualização substitui o histórico
+sintético pelos sorteios datados do servidor local, como um primeiro scraping real faria.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import date
+import requests
+from bench.fixtures import FixtureServer
+from synthetic import write_history
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def summarize(samples, seconds):
+    """Latências (ms) e débito de uma lista de (duração, estado)"""
+    latencies = sorted(duration for duration, _ in samples)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if status is None or status >= 400),
+        'throughput': round(len(samples) / seconds, 1) if seconds else None,
+        'p50Ms': to_ms(percentile(latencies, 0.50)),
+        'p99Ms': to_ms(percentile(latencies, 0.99)),
+        'maxMs': to_ms(latencies[-1] if latencies else None),
+    }
+
+def read_rss(pid):
+    """(RSS atual, pico) em MB a partir de /proc (None fora do Linux)"""
+    try:
+        with open(f'/proc/{pid}/status', 'r', encoding='utf-8') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None, None
+    to_mb = lambda name: round(int(fields[name].split()[0]) / 1024, 1) if name in fields else None
+    return to_mb('VmRSS'), to_mb('VmHWM')
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            rss, _ = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._done.wait(self.interval)
+
+    def finish(self):
+        self._done.set()
+        self.join()
+        return {'meanMb': round(sum(self.samples) / len(self.samples), 1) if self.samples else None,
+                'maxMb': max(self.samples, default=None)}
+
+def analysis_load(base_url, concurrency, seconds, conditional):
+    """`concurrency` clientes em ciclo sobre /api/analysis durante `seconds`"""
+    samples, lock = [], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client_loop():
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip'
+        etag = None
+        while time.perf_counter() < deadline:
+            headers = {'If-None-Match': etag} if conditional and etag else {}
+            started = time.perf_counter()
+            try:
+                response = session.get(f'{base_url}/api/analysis', headers=headers, timeout=120)
+                status = response.status_code
+                etag = response.headers.get('ETag', etag)
+            except requests.RequestException:
+                status = None
+            with lock:
+                samples.append((time.perf_counter() - started, status))
+
+    clients = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return samples
+
+def update_load(base_url, seconds, every, stop):
+    """POST /api/update a cada `every` segundos; devolve os pedidos e a duração de cada job"""
+    samples, jobs = [], []
+    session = requests.Session()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline and not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = session.post(f'{base_url}/api/update', timeout=30)
+            samples.append((time.perf_counter() - started, response.status_code))
+            job_id = response.json().get('jobId')
+        except (requests.RequestException, ValueError):
+            samples.append((time.perf_counter() - started, None))
+            job_id = None
+        while job_id and time.perf_counter() < deadline + 300:
+            job = session.get(f'{base_url}/api/update/{job_id}', timeout=30).json()
+            if job.get('status') not in ('pending', 'running'):
+                jobs.append({'status': job.get('status'), 'seconds': job.get('elapsedSeconds'),
+                             'totalDraws': (job.get('result') or {}).get('totalDraws')})
+                break
+            time.sleep(0.2)
+        stop.wait(max(0.0, every - (time.perf_counter() - started)))
+    return samples, jobs
+
+def start_server(data_dir, fixture_url):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'bench.load', 'serve', '--data-dir', data_dir, '--fixture-url', fixture_url],
+        cwd=REPO_DIR, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith('READY '):
+            _, port, warm_seconds = line.split()
+            # O resto do log do servidor é descartado, mas o pipe tem de continuar a ser lido
+            threading.Thread(target=lambda: process.stdout.read(), daemon=True).start()
+            return process, f'http://127.0.0.1:{port}', float(warm_seconds)
+    raise RuntimeError(f"O servidor terminou antes de arrancar (código {process.wait()})")
+
+def run(args):
+    data_dir = tempfile.mkdtemp(prefix='euromilhoes-load-')
+    report = {'size': args.size, 'skew': args.skew, 'concurrency': args.concurrency, 'phases': {}}
+    process = None
+    try:
+        if args.size:
+            started = time.perf_counter()
+            write_history(os.path.join(data_dir, 'draws.npy'), args.size, args.seed, args.skew)
+            report['generateSeconds'] = round(time.perf_counter() - started, 3)
+
+        with FixtureServer(2004, date.today().year, latency=args.latency) as fixtures:
+            process, base_url, warm_seconds = start_server(data_dir, fixtures.url)
+            report['warmSeconds'] = round(warm_seconds, 3)
+
+            phases = [('analysis', 0)] + ([('mixed', args.update_every)] if args.update_every else [])
+            for name, update_every in phases:
+                sampler = RssSampler(process.pid)
+                sampler.start()
+                stop, updates = threading.Event(), {}
+                updater = None
+                if update_every:
+                    def post_updates(every=update_every):
+                        updates['samples'], updates['jobs'] = update_load(base_url, args.duration, every, stop)
+                    updater = threading.Thread(target=post_updates)
+                    updater.start()
+                started = time.perf_counter()
+                samples = analysis_load(base_url, args.concurrency, args.duration, args.conditional)
+                elapsed = time.perf_counter() - started
+                stop.set()
+                if updater is not None:
+                    updater.join()
+                phase = {'analysis': summarize(samples, elapsed), 'rss': sampler.finish()}
+                if update_every:
+                    phase['update'] = summarize(updates.get('samples', []), elapsed)
+                    phase['jobs'] = updates.get('jobs', [])
+                report['phases'][name] = phase
+            report['peakRssMb'] = read_rss(process.pid)[1]
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+def serve(args):
+    """Processo do servidor: main.py sobre data_dir, scraping HTTP contra o servidor de fixtures"""
+    import logging
+    from werkzeug.serving import make_server
+    import main
+    from bench.suite import use_data_dir
+
+    logging.getLogger('werkzeug').disabled = True
+    use_data_dir(args.data_dir)
+    main.SCRAPER_BACKEND = 'http'
+    parser_class = main.HttpEuromilhoesParser
+    main.HttpEuromilhoesParser = lambda **kwargs: parser_class(base_url=args.fixture_url, **kwargs)
+
+    started = time.perf_counter()
+    main.analysis_entry()
+    warm_seconds = time.perf_counter() - started
+    server = make_server('127.0.0.1', 0, main.app, threaded=True)
+    print(f"READY {server.server_port} {warm_seconds:.3f}", flush=True)
+    server.serve_forever()
+    return 0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    serve_parser = commands.add_parser('serve', help='Uso interno: processo do servidor')
+    serve_parser.add_argument('--data-dir', required=True)
+    serve_parser.add_argument('--fixture-url', required=True)
+    parser.add_argument('--size', type=int, default=1_000_000, help='Sorteios do histórico sintético inicial')
+    parser.add_argument('--skew', type=float, default=0.0, help='Enviesamento da distribuição (0 = uniforme)')
+    parser.add_argument('--seed', type=int, default=2004)
+    parser.add_argument('--concurrency', type=int, default=16, help='Clientes simultâneos de /api/analysis')
+    parser.add_argument('--duration', type=float, default=20.0, help='Segundos por fase')
+    parser.add_argument('--update-every', type=float, default=0.0,
+                        help='Intervalo entre POST /api/update na fase mixed (0 = sem fase mixed)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Atraso artificial por página do site local (s)')
+    parser.add_argument('--conditional', action='store_true', help='Reenvia o ETag (If-None-Match) em cada pedido')
+    parser.add_argument('--output', help='Ficheiro JSON para o relatório')
+    args = parser.parse_args()
+    if args.command == 'serve':
+        return serve(args)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0 if all(phase['analysis']['errors'] == 0 for phase in report['phases'].values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,61 @@
+"""Benchmark do backfill multi-ano por backend, contra o servidor local de fixtures
+
+    python -m bench.scraping --backends http,selenium,selenium-pool --workers 4 --latency 0.5
+"""
+import argparse
+import json
+import time
+from datetime import date
+from bench.fixtures import FixtureServer
+from logic import EuromilhoesParser, ParallelEuromilhoesParser, HttpEuromilhoesParser, setup_headless_chrome_linux
+
+BACKENDS = ('http', 'selenium', 'selenium-pool')
+
+def create_backend(name, base_url, workers, chrome_binary_path):
+    if name == 'http':
+        return HttpEuromilhoesParser(chrome_binary_path, base_url=base_url, workers=workers)
+    if name == 'selenium':
+        return EuromilhoesParser(chrome_binary_path, reuse_browser=False, base_url=base_url)
+    return ParallelEuromilhoesParser(chrome_binary_path, workers=workers, base_url=base_url)
+
+def time_backfill(parser, start_year, end_year):
+    started = time.perf_counter()
+    draws = parser.extract_all_years(start_year, end_year)
+    elapsed = time.perf_counter() - started
+    parser.close()
+    return {'seconds': round(elapsed, 3), 'draws': len(draws), 'failedYears': sorted(parser.failed_years)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default='http,selenium,selenium-pool',
+                        help=f"Lista separada por virgulas de {', '.join(BACKENDS)}")
+    parser.add_argument('--chrome', help='Binário do Chrome (por omissão usa setup_headless_chrome_linux)')
+    parser.add_argument('--start', type=int, default=2004)
+    parser.add_argument('--end', type=int, default=date.today().year)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.5, help='Atraso artificial por página (s)')
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"Backends desconhecidos: {', '.join(sorted(unknown))}")
+    chrome_binary_path = args.chrome
+    if chrome_binary_path is None and any(b != 'http' for b in backends):
+        chrome_binary_path = setup_headless_chrome_linux()
+
+    results = {}
+    with FixtureServer(args.start, args.end, latency=args.latency) as server:
+        for name in backends:
+            backend = create_backend(name, server.url, args.workers, chrome_binary_path)
+            results[name] = time_backfill(backend, args.start, args.end)
+
+    print(json.dumps({
+        'years': args.end - args.start + 1,
+        'latency': args.latency,
+        'workers': args.workers,
+        'results': results,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Suite de benchmarks: parsing, análise, cache em disco, extração de linhas e latência da API
+
+    python -m bench.suite run --sizes 1868,10000,100000,1000000 --output bench/results/base.json
+    python -m bench.suite compare bench/results/base.json bench/results/new.json --threshold 0.10
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import main
+from bench.fixtures import FixtureServer
+from logic import analyze_and_generate_keys, HttpEuromilhoesParser, EuromilhoesParser, EXTRACTION_MODES
+from utils import parse_draw_line
+from storage import parse_draws
+
+DEFAULT_SIZES = (1868, 10000, 100000, 1000000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SEED = 2004
+
+def best_of(function, repeat):
+    """Melhor e média de `repeat` execuções (segundos)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {'seconds': round(min(timings), 6), 'mean': round(sum(timings) / len(timings), 6), 'repeat': repeat}
+
+DATA_PATHS = ('CACHE_FILE', 'DRAWS_FILE', 'ANALYSIS_STATE_FILE', 'MANIFEST_FILE', 'SHARED_ANALYSIS_FILE', 'UPDATE_LOCK_FILE',
+              'JOBS_DIR')
+
+def use_data_dir(data_dir):
+    """Aponta os ficheiros de dados do main.py para data_dir e devolve os valores anteriores"""
+    saved = {name: getattr(main, name) for name in ('DATA_DIR',) + DATA_PATHS}
+    saved['shared_analysis'] = main.shared_analysis
+    saved['jobs_status_dir'] = main.update_jobs.status_dir
+    for name in DATA_PATHS:
+        setattr(main, name, os.path.join(data_dir, os.path.basename(saved[name])))
+    main.DATA_DIR = data_dir
+    main.shared_analysis = main.SharedAnalysis(main.SHARED_ANALYSIS_FILE)
+    os.makedirs(main.JOBS_DIR, exist_ok=True)
+    main.update_jobs.status_dir = main.JOBS_DIR
+    return saved
+
+def restore_data_dir(saved):
+    saved = dict(saved)
+    main.update_jobs.status_dir = saved.pop('jobs_status_dir')
+    for name, value in saved.items():
+        setattr(main, name, value)
+
+@contextmanager
+def isolated_data_dir():
+    """Aponta os ficheiros de dados do main.py para um diretório temporário"""
+    data_dir = tempfile.mkdtemp(prefix='euromilhoes-bench-')
+    saved = use_data_dir(data_dir)
+    try:
+        yield data_dir
+    finally:
+        restore_data_dir(saved)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def reset_api_caches():
+    main._analysis_cache.update({'data': None, 'timestamp': None, 'version': None, 'etag': None, 'bodies': None})
+    main._draw_index_cache.update({'version': None, 'index': None})
+    main._search_keys_cache.update({'version': None, 'keys': None})
+    main._cooccurrence_cache.update({'version': None, 'entry': None})
+    main._top_keys_cache.update({'version': None, 'keys': {}})
+    for path in (main.ANALYSIS_STATE_FILE, main.SHARED_ANALYSIS_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+def bench_history(size, repeat):
+    lines = main.get_simulated_data(size, seed=SEED)
+    results = {}
+    parsing = best_of(lambda: [parse_draw_line(line) for line in lines], repeat)
+    parsing['perLineMicros'] = round(parsing['seconds'] / size * 1e6, 3)
+    results['parse_draw_line'] = parsing
+    batch = best_of(lambda: parse_draws(lines), repeat)
+    batch['perLineMicros'] = round(batch['seconds'] / size * 1e6, 3)
+    results['parse_draws'] = batch
+    results['analyze_and_generate_keys'] = best_of(lambda: analyze_and_generate_keys(lines), repeat)
+
+    with isolated_data_dir():
+        results['save_cache'] = best_of(lambda: main.save_cache(lines), repeat)
+        results['load_cache'] = best_of(main.load_cache, repeat)
+        results['load_draws'] = best_of(main.load_draws, repeat)
+
+        client = main.app.test_client()
+        cold = []
+        for _ in range(repeat):
+            reset_api_caches()
+            started = time.perf_counter()
+            client.get('/api/analysis')
+            cold.append(time.perf_counter() - started)
+        results['api_analysis_cold'] = {'seconds': round(min(cold), 6), 'mean': round(sum(cold) / repeat, 6), 'repeat': repeat}
+        results['api_analysis_warm'] = best_of(lambda: client.get('/api/analysis'), repeat)
+    return results
+
+def bench_extraction(repeat, chrome_binary_path=None, year=2024):
+    """Extração das linhas de um ano servido localmente (lxml; modos Selenium só com --chrome)"""
+    results = {}
+    with FixtureServer(year, year) as server:
+        parser = HttpEuromilhoesParser(base_url=server.url, workers=1)
+        results['extract_year_lxml'] = best_of(lambda: parser.extract_year(year), repeat)
+        parser.close()
+        if chrome_binary_path:
+            for mode in EXTRACTION_MODES:
+                scraper = EuromilhoesParser(chrome_binary_path, base_url=server.url, extraction=mode)
+                try:
+                    results[f'extract_year_selenium_{mode}'] = best_of(lambda: scraper.extract_year(year), repeat)
+                finally:
+                    scraper.close()
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {}
+    for size in sizes:
+        for name, result in bench_history(size, args.repeat).items():
+            results[f'{name}[{size}]'] = result
+            print(f"{name}[{size}]: {result['seconds']:.6f}s", file=sys.stderr)
+    for name, result in bench_extraction(args.repeat, args.chrome).items():
+        results[name] = result
+        print(f"{name}: {result['seconds']:.6f}s", file=sys.stderr)
+
+    report = {'environment': environment(), 'seed': SEED, 'results': results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados gravados em {output}", file=sys.stderr)
+    return 0
+
+def compare(args):
+    """Compara dois relatórios; código de saída 1 se algum benchmark piorou mais do que o limiar"""
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        candidate = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'benchmark':<44} {'antes':>12} {'depois':>12} {'var.':>8}")
+    for name in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[name]['seconds'], candidate[name]['seconds']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > args.threshold and after - before > args.min_delta:
+            flag = '  REGRESSAO'
+            regressions += 1
+        elif change < -args.threshold and before - after > args.min_delta:
+            flag = '  melhoria'
+        print(f"{name:<44} {before:>12.6f} {after:>12.6f} {change:>+8.1%}{flag}")
+    for name in sorted(set(baseline) ^ set(candidate)):
+        print(f"{name:<44} (apenas em {'antes' if name in baseline else 'depois'})")
+    return 1 if regressions else 0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Executa a suite e grava os resultados em JSON')
+    run_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help='Tamanhos dos históricos sintéticos (separados por vírgulas)')
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--chrome', help='Binário do Chrome para medir também a extração via Selenium')
+    run_parser.add_argument('--output', help='Ficheiro JSON de resultados (por omissão bench/results/<data>.json)')
+    compare_parser = commands.add_parser('compare', help='Compara dois ficheiros de resultados')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='Variação relativa tolerada (0.10 = 10%%)')
+    compare_parser.add_argument('--min-delta', type=float, default=0.001,
+                                help='Diferença absoluta mínima (s) para assinalar; evita ruído em medições de microssegundos')
+    args = parser.parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,157 @@
+import os
+import heapq
+import multiprocessing
+import numpy as np
+from functools import lru_cache
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+
+# Pesquisa exaustiva das 2.118.760 combinações de 5 números e dos 66 pares de estrelas.
+# A pontuação é separável (parte dos números + parte das estrelas), por isso as duas listas
+# ordenam-se em separado e as melhores chaves completas combinam o topo de cada uma.
+
+# Chamado pelo servidor multi-thread: sem fork, que herdaria bloqueios detidos por outras threads
+POOL_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+PROFILES = {
+    'principal': {'frequency': 1.0, 'overdue': 1.0, 'recent': 0.0, 'pairs': 0.5},
+    'secundaria': {'frequency': 1.0, 'overdue': 0.0, 'recent': 1.0, 'pairs': 0.5},
+    'hibrida': {'frequency': 1.0, 'overdue': 0.5, 'recent': 0.5, 'pairs': 0.5},
+}
+
+@lru_cache(maxsize=None)
+def _colex_table(size, universe):
+    """Combinações de `size` em range(universe) por ordem colex: as de range(m) são um prefixo"""
+    table = np.array(list(combinations(range(universe), size)), dtype=np.int8)
+    return table[np.lexsort(table.T)]
+
+def _chunk(first, max_value, size):
+    """Todas as combinações cujo menor valor (base 0) é `first`"""
+    rest = max_value - first - 1
+    table = _colex_table(size - 1, max_value - 1)
+    count = int(np.searchsorted(table[:, -1], rest, side='left'))
+    block = np.empty((count, size), dtype=np.int8)
+    block[:, 0] = first
+    block[:, 1:] = table[:count] + first + 1
+    return block
+
+def _features(stats, total_draws, default_gap):
+    counts = stats['count'].astype(np.float64)
+    recent = stats['veryRecent'].astype(np.float64)
+    gap_count = stats['gapCount']
+    avg_gap = np.where(gap_count > 0, stats['gapSum'] / np.maximum(gap_count, 1), default_gap)
+    current_gap = total_draws - 1 - stats['lastDraw']
+    return {
+        'frequency': counts / max(counts.mean(), 1e-9) - 1,
+        'overdue': np.minimum(current_gap / np.maximum(avg_gap, 1e-9), 3.0),
+        'recent': recent / max(recent.mean(), 1e-9) - 1,
+    }
+
+class LinearScorer:
+    """Pontuação = soma dos pesos por valor + peso * afinidade média dos pares da combinação
+
+    Qualquer objeto com values(group) -> (n,) e pairs(group) -> (n, n) serve como pontuador.
+    """
+    def __init__(self, state, weights):
+        total = max(state['total'], 1)
+        self.weights = dict(weights)
+        self._values = {}
+        self._pairs = {}
+        for group, max_value, size, default_gap in (('numbers', 50, 5, 10), ('stars', 12, 2, 5)):
+            features = _features(state[group], state['total'], default_gap)
+            self._values[group] = sum(self.weights.get(name, 0.0) * value for name, value in features.items())
+            pair_matrix = state.get('cooccurrence', {}).get('numberPairs' if group == 'numbers' else 'starPairs')
+            if pair_matrix is None or not self.weights.get('pairs'):
+                self._pairs[group] = np.zeros((max_value, max_value))
+                continue
+            # Co-ocorrência relativa ao esperado para um par ao acaso
+            expected = total * size * (size - 1) / (max_value * (max_value - 1))
+            pairs = pair_matrix / expected - 1
+            np.fill_diagonal(pairs, 0)
+            self._pairs[group] = self.weights['pairs'] * pairs / (size * (size - 1) / 2)
+
+    def values(self, group):
+        return self._values[group]
+
+    def pairs(self, group):
+        return self._pairs[group]
+
+def score_combinations(values, pairs, combos):
+    """Pontuação vetorizada de um bloco (m, k) de combinações (valores base 0)"""
+    combos = combos.astype(np.intp)
+    scores = values[combos].sum(axis=1)
+    for i, j in combinations(range(combos.shape[1]), 2):
+        scores += pairs[combos[:, i], combos[:, j]]
+    return scores
+
+def _top_in_chunks(values, pairs, firsts, max_value, size, limit, excluded):
+    """Top-K de um conjunto de blocos com heap limitado (corre num processo do pool)"""
+    heap = []
+    excluded = np.array(sorted(excluded), dtype=np.int8)
+    for first in firsts:
+        block = _chunk(first, max_value, size)
+        if len(excluded):
+            block = block[~np.isin(block, excluded).any(axis=1)]
+        if len(block) == 0:
+            continue
+        scores = score_combinations(values, pairs, block)
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(scores))
+        for i in best.tolist():
+            item = (float(scores[i]), block[i].tolist())
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return heap
+
+def top_combinations(scorer, group='numbers', limit=10, excluded=(), workers=None):
+    """As `limit` melhores combinações [(score, [valores base 1])], avaliadas por blocos em paralelo"""
+    max_value, size = (50, 5) if group == 'numbers' else (12, 2)
+    excluded = {value - 1 for value in excluded}
+    firsts = [first for first in range(max_value - size + 1) if first not in excluded]
+    values, pairs = np.asarray(scorer.values(group)), np.asarray(scorer.pairs(group))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(firsts)))
+    if group == 'numbers' and workers > 1:
+        # Blocos alternados: os primeiros valores são os maiores
+        parts = [firsts[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+            futures = [pool.submit(_top_in_chunks, values, pairs, part, max_value, size, limit, excluded) for part in parts]
+            heaps = [future.result() for future in futures]
+    else:
+        heaps = [_top_in_chunks(values, pairs, firsts, max_value, size, limit, excluded)]
+    best = heapq.nlargest(limit, (item for heap in heaps for item in heap))
+    return [(score, [value + 1 for value in combo]) for score, combo in best]
+
+def top_keys(scorer, limit=10, workers=None):
+    """As `limit` melhores chaves completas (5 números x 66 pares de estrelas) sem formar o produto"""
+    numbers = top_combinations(scorer, 'numbers', limit, workers=workers)
+    stars = top_combinations(scorer, 'stars', limit, workers=workers)
+    if not numbers or not stars:
+        return []
+    # k melhores somas de duas listas ordenadas: fronteira (i, j) num heap
+    heap, seen, keys = [(-(numbers[0][0] + stars[0][0]), 0, 0)], {(0, 0)}, []
+    while heap and len(keys) < limit:
+        score, i, j = heapq.heappop(heap)
+        keys.append({'numbers': numbers[i][1], 'stars': stars[j][1], 'score': round(-score, 4)})
+        for ni, nj in ((i + 1, j), (i, j + 1)):
+            if ni < len(numbers) and nj < len(stars) and (ni, nj) not in seen:
+                seen.add((ni, nj))
+                heapq.heappush(heap, (-(numbers[ni][0] + stars[nj][0]), ni, nj))
+    return keys
+
+def generate_search_keys(state, profiles=None, workers=None):
+    """Uma chave por perfil, a melhor combinação sem números nem estrelas usados por chaves anteriores"""
+    used_nums, used_stars, keys = set(), set(), {}
+    for name, weights in (profiles or PROFILES).items():
+        scorer = LinearScorer(state, weights)
+        numbers = top_combinations(scorer, 'numbers', 1, used_nums, workers)
+        stars = top_combinations(scorer, 'stars', 1, used_stars, workers)
+        if not numbers or not stars:
+            break
+        keys[name] = {'numbers': numbers[0][1], 'stars': stars[0][1], 'score': round(numbers[0][0] + stars[0][0], 4)}
+        used_nums.update(numbers[0][1])
+        used_stars.update(stars[0][1])
+    return keys
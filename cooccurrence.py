@@ -0,0 +1,79 @@
+import numpy as np
+from itertools import combinations
+from storage import as_draws
+
+# Co-ocorrências: matrizes simétricas de pares (números 50x50, estrelas 12x12) e contagens
+# densas de trios de números (50^3 posições, ~0.5 MB) de onde se extrai a tabela top-K.
+# Tudo é aditivo, por isso os sorteios novos somam-se sem voltar a percorrer o histórico.
+
+def _columns(width, size):
+    return np.array(list(combinations(range(width), size)), dtype=np.intp)
+
+def _combination_keys(values, max_value, size):
+    """Chave única por combinação (ordenada) de `size` valores dentro de cada sorteio"""
+    values = np.sort(np.asarray(values, dtype=np.int64), axis=1) - 1
+    columns = _columns(values.shape[1], size)
+    keys = sum(values[:, columns[:, position]] * max_value ** (size - 1 - position) for position in range(size))
+    return keys.ravel()
+
+def pair_matrix(values, max_value):
+    """Matriz max_value x max_value com o número de sorteios em que cada par saiu junto"""
+    upper = np.bincount(_combination_keys(values, max_value, 2), minlength=max_value * max_value)
+    upper = upper.reshape(max_value, max_value).astype(np.int32)
+    return upper + upper.T
+
+def triple_counts(values, max_value):
+    return np.bincount(_combination_keys(values, max_value, 3), minlength=max_value ** 3).astype(np.int32)
+
+def build_cooccurrence(draws):
+    """Uma passagem vetorizada sobre o histórico"""
+    draws = as_draws(draws)
+    if len(draws) == 0:
+        return {
+            'numberPairs': np.zeros((50, 50), dtype=np.int32),
+            'starPairs': np.zeros((12, 12), dtype=np.int32),
+            'numberTriples': np.zeros(50 ** 3, dtype=np.int32),
+        }
+    return {
+        'numberPairs': pair_matrix(draws['numbers'], 50),
+        'starPairs': pair_matrix(draws['stars'], 12),
+        'numberTriples': triple_counts(draws['numbers'], 50),
+    }
+
+def apply_cooccurrence(cooccurrence, new_draws):
+    """Soma os sorteios novos em O(len(new_draws))"""
+    delta = build_cooccurrence(new_draws)
+    return {name: cooccurrence[name] + delta[name] for name in delta}
+
+def top_pairs(pairs, limit=10):
+    """Pares mais frequentes: [{'values': [a, b], 'count'}]"""
+    size = pairs.shape[0]
+    rows, cols = np.triu_indices(size, k=1)
+    counts = pairs[rows, cols]
+    order = np.argsort(-counts, kind='stable')[:limit]
+    return [{'values': [int(rows[i]) + 1, int(cols[i]) + 1], 'count': int(counts[i])} for i in order]
+
+def top_triples(triples, limit=10, max_value=50):
+    """Tabela esparsa top-K de trios a partir das contagens densas"""
+    limit = min(limit, int(np.count_nonzero(triples)))
+    if limit <= 0:
+        return []
+    candidates = np.argpartition(-triples, limit - 1)[:limit]
+    candidates = candidates[np.lexsort((candidates, -triples[candidates]))]
+    return [
+        {'values': [int(key // max_value ** 2) + 1, int(key // max_value % max_value) + 1, int(key % max_value) + 1],
+         'count': int(triples[key])}
+        for key in candidates
+    ]
+
+def companions(pairs, value, limit=10):
+    """Valores que mais vezes saíram com `value`"""
+    row = pairs[value - 1]
+    order = np.argsort(-row, kind='stable')
+    return [{'value': int(i) + 1, 'count': int(row[i])} for i in order if i != value - 1][:limit]
+
+def affinity_scores(pairs, chosen):
+    """Soma das co-ocorrências de cada valor com os já escolhidos (vetor, uma linha por valor escolhido)"""
+    if not chosen:
+        return np.zeros(pairs.shape[0], dtype=np.int64)
+    return pairs[np.asarray(chosen, dtype=np.intp) - 1].sum(axis=0, dtype=np.int64)
@@ -0,0 +1,89 @@
+import numpy as np
+from storage import as_draws
+
+# Índice sobre a sequência de sorteios: posições de ocorrência por valor numa única chave ordenada.
+# Contagens, primeiro e último sorteio de uma janela saem de pesquisas binárias (O(log n) por valor),
+# com memória proporcional ao número de ocorrências (8 B cada) em vez de uma tabela densa por sorteio.
+
+def _value_index(values, max_value):
+    values = np.asarray(values)
+    total_draws = len(values)
+    flat = values.ravel().astype(np.int64)
+    rows = np.repeat(np.arange(total_draws, dtype=np.int64), values.shape[1])
+
+    # Ocorrências ordenadas por (valor, sorteio) numa única chave monótona: valor * stride + sorteio
+    stride = total_draws + 1
+    order = np.lexsort((rows, flat))
+    return {'maxValue': max_value, 'stride': stride, 'keys': (flat[order] - 1) * stride + rows[order]}
+
+def build_draw_index(draws):
+    """Constrói o índice numa passagem; as consultas por janela não voltam a percorrer o histórico"""
+    draws = as_draws(draws)
+    return {
+        'total': len(draws),
+        'dates': np.array(draws['date'], dtype=np.int64),
+        'numbers': _value_index(draws['numbers'], 50),
+        'stars': _value_index(draws['stars'], 12),
+    }
+
+def resolve_window(index, start=None, end=None, start_date=None, end_date=None):
+    """Converte limites inclusivos (posição ou data AAAAMMDD) numa janela semiaberta [start, end)
+
+    ValueError para posições fora do histórico, limites invertidos ou uma janela sem sorteios.
+    """
+    total = index['total']
+    for name, position in (('from', start), ('to', end)):
+        if position is not None and not 0 <= position < total:
+            raise ValueError(f"posicao '{name}' fora de [0, {total - 1}]: {position}")
+    if (start is not None and end is not None and start > end) or (
+            start_date is not None and end_date is not None and start_date > end_date):
+        raise ValueError("'from' depois de 'to'")
+    lo = 0 if start is None else start
+    hi = total if end is None else end + 1
+    if start_date is not None:
+        lo = max(lo, int(np.searchsorted(index['dates'], start_date, side='left')))
+    if end_date is not None:
+        hi = min(hi, int(np.searchsorted(index['dates'], end_date, side='right')))
+    lo = min(max(lo, 0), total)
+    hi = min(max(hi, lo), total)
+    if hi == lo:
+        raise ValueError('janela sem sorteios')
+    return lo, hi
+
+def window_stats(value_index, start, end, recent_window=30):
+    """Estatísticas no formato de frequency_stats para a janela [start, end), posições relativas a start"""
+    keys, stride = value_index['keys'], value_index['stride']
+    base = np.arange(value_index['maxValue'], dtype=np.int64) * stride
+
+    # Ocorrências do valor v na janela = chaves em [v * stride + start, v * stride + end)
+    first_at = np.searchsorted(keys, base + start, side='left')
+    end_at = np.searchsorted(keys, base + end, side='left')
+    counts = (end_at - first_at).astype(np.int64)
+    recent_start = max(start, end - recent_window)
+    very_recent = (end_at - np.searchsorted(keys, base + recent_start, side='left')).astype(np.int64)
+
+    seen = counts > 0
+    last_at = end_at - 1
+    first = keys[np.minimum(first_at, len(keys) - 1)] - base if len(keys) else base
+    last = keys[np.maximum(last_at, 0)] - base if len(keys) else base
+    last_draw = np.where(seen, last - start, -1)
+    gap_sum = np.where(seen, last - first, 0)
+
+    return {
+        'count': counts,
+        'lastDraw': last_draw,
+        'gapSum': gap_sum,
+        'gapCount': np.maximum(counts - 1, 0),
+        'veryRecent': very_recent,
+    }
+
+def overdue_ranking(stats, total_draws, limit=5, default_gap=10):
+    """Valores com mais sorteios desde a última saída, com o rácio face ao intervalo médio"""
+    current_gap = total_draws - 1 - stats['lastDraw']
+    gap_count = stats['gapCount']
+    avg_gap = np.where(gap_count > 0, stats['gapSum'] / np.maximum(gap_count, 1), default_gap)
+    ranking = np.argsort(-current_gap, kind='stable')[:limit]
+    return [
+        {'number': int(i) + 1, 'drawsAgo': int(current_gap[i]), 'overdueRatio': round(float(current_gap[i] / avg_gap[i]), 2)}
+        for i in ranking
+    ]
@@ -0,0 +1,279 @@
+import os
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime
+from storage import write_json_atomic
+from shared_cache import file_lock
+from utils import log_error, log_warning
+
+try:
+    import fcntl
+except ImportError:  # Windows: um só worker, sem jobs de outros processos
+    fcntl = None
+
+class UpdateJob:
+    """Estado de uma atualização em segundo plano (progresso por ano, sorteios, tempos)"""
+
+    def __init__(self, status_path=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.status_path = status_path
+        self.status = 'pending'
+        self.message = None
+        self.result = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._elapsed = None
+        self._owner = None
+        self._years = {}
+        self._planned_years = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Eventos para /api/update/<id>/events: (id sequencial, tipo, dados), esperados via _changed
+        self._events = []
+        self._changed = threading.Condition()
+
+    def plan_years(self, years):
+        with self._lock:
+            self._planned_years = list(years)
+            for year in self._planned_years:
+                self._years.setdefault(year, {'year': year, 'status': 'pending', 'draws': 0, 'seconds': None, 'error': None})
+
+    def record_year(self, year, draws, seconds, error):
+        with self._lock:
+            self._years[year] = {
+                'year': year,
+                'status': 'error' if error else 'unchanged' if draws is None else 'done',
+                'draws': len(draws or []),
+                'seconds': round(seconds, 3),
+                'error': error,
+            }
+            entry = dict(self._years[year])
+            entry['yearsDone'] = sum(1 for y in self._years.values() if y['status'] != 'pending')
+            entry['yearsTotal'] = len(self._years)
+        self.save_status()
+        self.publish('year', entry)
+
+    def publish(self, event, data):
+        with self._changed:
+            self._events.append((len(self._events) + 1, event, data))
+            self._changed.notify_all()
+
+    def events_after(self, last_id, timeout=None):
+        """Eventos com id > last_id; espera até timeout por novos enquanto o job corre"""
+        with self._changed:
+            if len(self._events) <= last_id and self.running:
+                self._changed.wait(timeout)
+            return self._events[last_id:]
+
+    def finish(self, status, message=None):
+        with self._changed:
+            self.status = status
+            if message is not None:
+                self.message = message
+            self._elapsed = time.perf_counter() - self._started
+            self.finished_at = datetime.now().isoformat()
+        self.save_status()
+        self.publish('done', self.to_dict())
+
+    def save_status(self):
+        """Grava o estado em status_path, para que os outros workers do servidor o possam consultar"""
+        if self.status_path is None:
+            return
+        try:
+            with self._save_lock:
+                write_json_atomic(self.status_path, self.to_dict())
+        except OSError as e:
+            log_error(f"Erro ao gravar estado do job {self.id}: {e}")
+
+    @property
+    def running(self):
+        return self.status in ('pending', 'running')
+
+    def to_dict(self):
+        with self._lock:
+            years = [self._years[year] for year in sorted(self._years)]
+            elapsed = self._elapsed
+            if elapsed is None and self._started is not None:
+                elapsed = time.perf_counter() - self._started
+            return {
+                'id': self.id,
+                'status': self.status,
+                'message': self.message,
+                'createdAt': self.created_at,
+                'startedAt': self.started_at,
+                'finishedAt': self.finished_at,
+                'elapsedSeconds': round(elapsed, 3) if elapsed is not None else None,
+                'yearsTotal': len(years),
+                'yearsDone': sum(1 for y in years if y['status'] != 'pending'),
+                'drawsFound': sum(y['draws'] for y in years),
+                'years': [dict(y) for y in years],
+                'result': self.result,
+            }
+
+def _hold_owner_lock(path):
+    """Abre e bloqueia (flock) o marcador de um job em curso; o bloqueio cai se o processo morrer"""
+    owner = open(path, 'a+b')
+    fcntl.flock(owner.fileno(), fcntl.LOCK_EX)
+    return owner
+
+def _owner_alive(path):
+    """True se o processo dono do job ainda detém o bloqueio do marcador"""
+    try:
+        with open(path, 'rb') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return False
+    except OSError:
+        return False
+
+class SingleFlight:
+    """Uma execução de cada vez por chave: chamadas concorrentes esperam pelo resultado da que já corre"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        """Devolve (resultado, partilhado); partilhado é True se outra chamada fez o trabalho"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+class JobManager:
+    """Executa atualizações num worker em segundo plano, com no máximo uma em curso (single-flight)"""
+
+    def __init__(self, target, history=20, status_dir=None):
+        self.target = target
+        self.history = history
+        self.status_dir = status_dir
+        if status_dir:
+            os.makedirs(status_dir, exist_ok=True)
+        self._jobs = {}
+        self._current = None
+        self._lock = threading.Lock()
+
+    def submit(self):
+        """Devolve (estado do job, criado): pedidos concorrentes, deste ou de outro worker, juntam-se ao job em curso"""
+        with self._lock:
+            if self._current is not None and self._current.running:
+                return self._current.to_dict(), False
+            if self.status_dir and fcntl is not None:
+                # Entre workers: procura e criação sob o mesmo bloqueio, para só um criar o job
+                with file_lock(os.path.join(self.status_dir, 'submit.lock')):
+                    running = self._running_elsewhere()
+                    if running is not None:
+                        return running, False
+                    job = self._create()
+            else:
+                job = self._create()
+        threading.Thread(target=self._run, args=(job,), name=f'update-{job.id}', daemon=True).start()
+        return job.to_dict(), True
+
+    def _create(self):
+        job = UpdateJob()
+        job.status_path = self._status_path(job.id)
+        if job.status_path and fcntl is not None:
+            job._owner = _hold_owner_lock(self._owner_path(job.id))
+        self._jobs[job.id] = job
+        self._current = job
+        for old_id in list(self._jobs)[:-self.history]:
+            del self._jobs[old_id]
+            for old_path in (self._status_path(old_id), self._owner_path(old_id)):
+                if old_path and os.path.exists(old_path):
+                    os.remove(old_path)
+        job.save_status()
+        return job
+
+    def _running_elsewhere(self):
+        """Estado do job em curso noutro worker (None se não houver); jobs de workers mortos ficam como erro"""
+        for name in os.listdir(self.status_dir):
+            job_id, extension = os.path.splitext(name)
+            if extension != '.json' or job_id in self._jobs:
+                continue
+            snapshot = self._read_status(job_id)
+            if snapshot is None or snapshot['status'] not in ('pending', 'running'):
+                continue
+            if _owner_alive(self._owner_path(job_id)):
+                return snapshot
+            log_warning(f"Job {job_id} sem worker ativo - marcado como erro")
+            snapshot.update({'status': 'error', 'message': 'Worker terminado durante a atualizacao'})
+            try:
+                write_json_atomic(self._status_path(job_id), snapshot)
+                os.remove(self._owner_path(job_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log_error(f"Erro ao gravar estado do job {job_id}: {e}")
+        return None
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """Estado de um job deste processo ou, pelo ficheiro de estado, de outro worker (None se desconhecido)"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._read_status(job_id)
+
+    def _read_status(self, job_id):
+        path = self._status_path(job_id) if job_id.isalnum() else None
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _status_path(self, job_id):
+        return os.path.join(self.status_dir, f'{job_id}.json') if self.status_dir else None
+
+    def _owner_path(self, job_id):
+        return os.path.join(self.status_dir, f'{job_id}.owner') if self.status_dir else None
+
+    def current(self):
+        with self._lock:
+            return self._current
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        job._started = time.perf_counter()
+        job.save_status()
+        try:
+            job.result = self.target(job)
+            job.finish('success')
+        except Exception as e:
+            log_error(f"Erro no job de atualizacao {job.id}: {e}")
+            job.finish('error', str(e))
+        finally:
+            if job._owner is not None:
+                job._owner.close()
+                job._owner = None
+                if os.path.exists(self._owner_path(job.id)):
+                    os.remove(self._owner_path(job.id))
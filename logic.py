@@ -4,76 +4,167 @@
 import os
 import sys
 import re
-import requests
-import zipfile
-import io
 import stat
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-from utils import parse_draw_line
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from utils import log_warning, log_error
+from storage import as_draws
+from cooccurrence import build_cooccurrence, apply_cooccurrence, affinity_scores
+from metrics import timed, instrumented
+
+# Selenium, webdriver_manager, requests, bs4 and lxml are imported where they are used, so that
+# serving the dashboard from existing data never loads the scraping stack
 
 def setup_headless_chrome_linux():
-    project_dir = os.getcwd()
-    chrome_dir = os.path.join(project_dir, "chrome")
-    binary_path = os.path.join(chrome_dir, "chrome-headless-shell")
-
-    if os.path.exists(binary_path):
-        if not os.access(binary_path, os.X_OK): os.chmod(binary_path, stat.S_IRWXU)
-        return binary_path
+    """chrome-headless-shell from the local chrome/ manifest (no network), provisioned on first use"""
+    from provisioning import CHROME_DIR, installed_binaries, provision
+
+    binaries = installed_binaries()
+    if binaries:
+        return binaries[0]
+    # Layout used before the manifest: the shell extracted straight into chrome/
+    legacy_path = os.path.join(CHROME_DIR, "chrome-headless-shell")
+    if os.path.exists(legacy_path):
+        if not os.access(legacy_path, os.X_OK): os.chmod(legacy_path, stat.S_IRWXU)
+        return legacy_path
 
     try:
-        os.makedirs(chrome_dir, exist_ok=True)
-        # Use a more reliable way to get the URL if possible, this is fragile
-        page_url = "https://googlechromelabs.github.io/chrome-for-testing/"
-        response = requests.get(page_url, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
-        stable_section = soup.find('section', id='stable')
-        if not stable_section: raise RuntimeError("Stable section not found on Chrome for Testing page")
-        
-        rows = stable_section.find_all('tr')
-        zip_url = None
-        for row in rows:
-            cells = row.find_all(['th', 'td'])
-            if len(cells) >= 3 and cells[0].text.strip() == 'chrome-headless-shell' and cells[1].text.strip() == 'linux64':
-                zip_url = cells[2].text.strip()
-                break
-        if not zip_url: raise RuntimeError("URL for 'chrome-headless-shell linux64' not found")
-        
-        r = requests.get(zip_url, stream=True, timeout=300)
-        r.raise_for_status()
-        zip_content = io.BytesIO(r.content)
-        
-        with zipfile.ZipFile(zip_content) as zf:
-            prefix = os.path.commonprefix(zf.namelist())
-            for member in zf.infolist():
-                if member.filename.startswith(prefix):
-                    member.filename = member.filename[len(prefix):]
-                    if member.filename: zf.extract(member, chrome_dir)
-        
-        os.chmod(binary_path, stat.S_IRWXU)
-        return binary_path
+        provision()
+        return installed_binaries()[0]
     except Exception as e:
         print(f"\n    ↳ Failed to download chrome: {e}", file=sys.stderr)
         if os.path.exists("/usr/bin/google-chrome"):
             return "/usr/bin/google-chrome"
         return None
 
+@lru_cache(maxsize=None)
+def _webdriver_manager_driver():
+    # Only for browsers outside chrome/; resolved once per process instead of on every driver
+    from webdriver_manager.chrome import ChromeDriverManager
+    os.environ['WDM_LOG'] = '0'
+    return ChromeDriverManager().install()
+
 _browser_instance = None
 _browser_lock = None
 
-class EuromilhoesParser:
-    def __init__(self, chrome_binary_path, timeout=15, reuse_browser=True):
+RESULTS_BASE_URL = "https://www.euro-millions.com"
+
+EXTRACTION_MODES = ('script', 'page_source', 'elements')
+
+# Reads every row of the results table in a single WebDriver round trip
+_EXTRACT_ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll('#resultsTable tr.resultRow')).map(function (row) {
+    var link = row.querySelector('a[href*="/results/"]');
+    return [link ? link.getAttribute('href') : null,
+            Array.from(row.querySelectorAll('ul.balls li.resultBall')).map(function (ball) {
+                return [ball.textContent.trim(), ball.classList.contains('lucky-star')];
+            })];
+});
+"""
+
+_RESULT_DATE_RE = re.compile(r'/results/(\d{2})-(\d{2})-(\d{4})')
+
+def parse_result_date(href):
+    """YYYYMMDD from a /results/DD-MM-YYYY link, 0 when there is none"""
+    match = _RESULT_DATE_RE.search(href or '')
+    if not match:
+        return 0
+    day, month, year = (int(part) for part in match.groups())
+    return year * 10000 + month * 100 + day
+
+def format_draw_balls(balls):
+    """Draw line from (text, is_star) ball pairs, or None if it is not 5 numbers + 2 stars"""
+    main_numbers = [text for text, is_star in balls if text.isdigit() and not is_star]
+    star_numbers = [text for text, is_star in balls if text.isdigit() and is_star]
+    if len(main_numbers) == 5 and len(star_numbers) == 2:
+        return f"{' '.join(main_numbers)} + {' '.join(star_numbers)}"
+    return None
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+@lru_cache(maxsize=None)
+def _result_xpaths():
+    """Compiled once, on the first page parsed"""
+    from lxml import etree
+    return (etree.XPath(f"//*[@id='resultsTable']//tr[{_has_class('resultRow')}]"),
+            etree.XPath(f".//ul[{_has_class('balls')}]/li[{_has_class('resultBall')}]"),
+            etree.XPath(".//a[contains(@href, '/results/')]/@href"))
+
+def parse_results_html(page_html):
+    """(date, draw line) rows from a results-history page, or None when it has no #resultsTable"""
+    from lxml import html as lxml_html
+    result_rows, result_balls, result_link = _result_xpaths()
+    tree = lxml_html.fromstring(page_html)
+    if tree.get_element_by_id('resultsTable', None) is None:
+        return None
+    results = []
+    for row in result_rows(tree):
+        balls = [(ball.text_content().strip(), 'lucky-star' in ball.get('class', '')) for ball in result_balls(row)]
+        draw = format_draw_balls(balls)
+        if draw:
+            links = result_link(row)
+            results.append((parse_result_date(links[0] if links else None), draw))
+    return results
+
+class YearScraper:
+    """Per-year retries and failure bookkeeping shared by the results-history backends"""
+    retries = 2
+    # Optional callback(year, draws, seconds, error) called once per finished year
+    on_year_done = None
+
+    def extract_year(self, year):
+        """[(date YYYYMMDD or 0, draw line)] in page order"""
+        raise NotImplementedError
+
+    def extract_year_with_retries(self, year):
+        attempts = self.retries + 1
+        started = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            try:
+                with timed('extract_year', backend=type(self).__name__):
+                    year_results = self.extract_year(year)
+                self.failed_years.pop(year, None)
+                if self.on_year_done:
+                    self.on_year_done(year, year_results, time.perf_counter() - started, None)
+                return year_results
+            except Exception as e:
+                self.failed_years[year] = f"{type(e).__name__}: {e}".strip()
+                log_warning(f"Falha ao obter {year} (tentativa {attempt}/{attempts}): {self.failed_years[year]}")
+        log_error(f"Ano {year} ignorado apos {attempts} tentativas")
+        if self.on_year_done:
+            self.on_year_done(year, [], time.perf_counter() - started, self.failed_years[year])
+        return []
+
+    def extract_years(self, years):
+        """{year: (date, line) rows} for every year that was fetched; None when the page was not modified"""
+        results = {}
+        for year in years:
+            year_results = self.extract_year_with_retries(year)
+            if year not in self.failed_years:
+                results[year] = year_results
+        return results
+
+    def extract_all_years(self, start_year, end_year):
+        results = self.extract_years(range(start_year, end_year + 1))
+        return [draw for year in sorted(results) for _, draw in results[year] or []]
+
+class EuromilhoesParser(YearScraper):
+    def __init__(self, chrome_binary_path, timeout=15, reuse_browser=True, base_url=RESULTS_BASE_URL, retries=2,
+                 extraction='script'):
+        if extraction not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {extraction}")
         self.chrome_binary_path = chrome_binary_path
         self.timeout = timeout
         self.reuse_browser = reuse_browser
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.extraction = extraction
+        self.failed_years = {}
         self.driver = self.get_or_create_driver() if reuse_browser else self.setup_driver()
 
     def get_or_create_driver(self):
@@ -90,7 +181,13 @@ class EuromilhoesParser:
         _browser_instance = self.setup_driver()
         return _browser_instance
 
+    @instrumented('setup_driver')
     def setup_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from provisioning import installed_binaries
+
         if not self.chrome_binary_path or not os.path.exists(self.chrome_binary_path):
             raise FileNotFoundError(f"Chrome executable not found: {self.chrome_binary_path}")
 
@@ -102,14 +199,17 @@ class EuromilhoesParser:
         chrome_options.add_argument("--log-level=3")
         chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
 
-        os.environ['WDM_LOG'] = '0'
+        binaries = installed_binaries()
+        if binaries and os.path.realpath(binaries[0]) == os.path.realpath(self.chrome_binary_path):
+            # Matching chromedriver from the local manifest: no network access
+            return webdriver.Chrome(service=Service(binaries[1]), options=chrome_options)
         try:
-            service = Service(ChromeDriverManager().install())
-            return webdriver.Chrome(service=service, options=chrome_options)
+            return webdriver.Chrome(service=Service(_webdriver_manager_driver()), options=chrome_options)
         except Exception:
             return webdriver.Chrome(options=chrome_options)
 
     def extract_numbers_from_row(self, row):
+        from selenium.webdriver.common.by import By
         try:
             balls = row.find_elements(by=By.CSS_SELECTOR, value="ul.balls li.resultBall")
             main_numbers = [b.text for b in balls if b.text.isdigit() and "lucky-star" not in b.get_attribute("class")]
@@ -119,149 +219,434 @@ class EuromilhoesParser:
             return None
         except Exception: return None
 
-    def extract_all_years(self, start_year, end_year):
-        all_results = []
-        for year in range(start_year, end_year + 1):
-            url = f"https://www.euro-millions.com/results-history-{year}"
-            try:
-                self.driver.get(url)
-                WebDriverWait(self.driver, self.timeout).until(EC.presence_of_element_located((By.ID, "resultsTable")))
-                result_rows = self.driver.find_elements(by=By.CSS_SELECTOR, value="tr.resultRow")
-                year_results = [self.extract_numbers_from_row(row) for row in result_rows]
-                all_results.extend(res for res in year_results if res)
-            except Exception: pass
-        return all_results
+    def extract_date_from_row(self, row):
+        from selenium.webdriver.common.by import By
+        try:
+            link = row.find_element(by=By.CSS_SELECTOR, value="a[href*='/results/']")
+            return parse_result_date(link.get_attribute("href"))
+        except Exception: return 0
+
+    def extract_year(self, year):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.driver.get(f"{self.base_url}/results-history-{year}")
+        WebDriverWait(self.driver, self.timeout).until(EC.presence_of_element_located((By.ID, "resultsTable")))
+        if self.extraction == 'script':
+            rows = self.driver.execute_script(_EXTRACT_ROWS_SCRIPT)
+            year_results = [(parse_result_date(href), format_draw_balls(balls)) for href, balls in rows]
+        elif self.extraction == 'page_source':
+            year_results = parse_results_html(self.driver.page_source) or []
+        else:
+            result_rows = self.driver.find_elements(by=By.CSS_SELECTOR, value="tr.resultRow")
+            year_results = [(self.extract_date_from_row(row), self.extract_numbers_from_row(row)) for row in result_rows]
+        return [(date, draw) for date, draw in year_results if draw]
 
     def close(self):
         if not self.reuse_browser and self.driver:
             self.driver.quit()
 
-def initialize_frequency_data(max_value):
-    data = {}
-    for i in range(1, max_value + 1):
-        data[i] = {'count': 0, 'lastDraw': -1, 'gaps': [], 'veryRecent': 0}
-    return data
-
-def update_frequency_data(data_dict, items, index, total_draws, recent_window=30):
-    for item in items:
-        data_dict[item]['count'] += 1
-        if data_dict[item]['lastDraw'] != -1:
-            data_dict[item]['gaps'].append(index - data_dict[item]['lastDraw'])
-        data_dict[item]['lastDraw'] = index
-        if index >= total_draws - recent_window:
-            data_dict[item]['veryRecent'] += 1
-
-def calculate_numbers_analysis(numbers_data, total_draws, default_gap=10):
+class HttpEuromilhoesParser(YearScraper):
+    """Browser-free backend: keep-alive requests sessions + lxml, Selenium only for pages without #resultsTable"""
+
+    def __init__(self, chrome_binary_path=None, timeout=15, base_url=RESULTS_BASE_URL, retries=2, workers=4,
+                 validators=None):
+        self.chrome_binary_path = chrome_binary_path
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.workers = max(1, workers)
+        self.failed_years = {}
+        # {year: {'etag', 'lastModified'}} used for conditional requests and refreshed on every 200
+        self.validators = dict(validators or {})
+        self._local = threading.local()
+        self._sessions = []
+        self._fallback = None
+        self._lock = threading.Lock()
+        self._fallback_lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)'
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def fetch_year_page(self, year):
+        """Response for a year page, or None when the server answers 304 Not Modified"""
+        headers = {}
+        cached = self.validators.get(year) or {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('lastModified'):
+            headers['If-Modified-Since'] = cached['lastModified']
+        response = self._session().get(f"{self.base_url}/results-history-{year}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            # Erros e páginas de bloqueio não têm tabela: falham aqui em vez de cair no Selenium
+            response.raise_for_status()
+            raise RuntimeError(f"Resposta HTTP {response.status_code} inesperada para {year}")
+        return response
+
+    def _selenium_extract_year(self, year):
+        # A single browser serves every fallback, so calls are serialised
+        with self._fallback_lock:
+            if self._fallback is None:
+                chrome_binary_path = self.chrome_binary_path or setup_headless_chrome_linux()
+                self._fallback = EuromilhoesParser(chrome_binary_path, timeout=self.timeout,
+                                                   reuse_browser=False, base_url=self.base_url)
+            return self._fallback.extract_year(year)
+
+    def extract_year(self, year):
+        response = self.fetch_year_page(year)
+        if response is None:
+            return None
+        year_results = parse_results_html(response.text)
+        if year_results is None:
+            log_warning(f"Pagina de {year} sem tabela de resultados, a usar Selenium")
+            # Os validadores guardados eram de outra versão da página
+            self.validators.pop(year, None)
+            return self._selenium_extract_year(year)
+        self.validators[year] = {
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+        }
+        return year_results
+
+    def extract_years(self, years):
+        years = list(years)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(years)) or 1) as pool:
+            year_results = list(pool.map(self.extract_year_with_retries, years))
+        return {year: results for year, results in zip(years, year_results) if year not in self.failed_years}
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+        self._sessions = []
+        if self._fallback is not None:
+            self._fallback.close()
+            self._fallback = None
+
+class ParallelEuromilhoesParser(YearScraper):
+    """Same interface as EuromilhoesParser, backed by a bounded pool of browsers (one driver per worker)"""
+
+    def __init__(self, chrome_binary_path, workers=4, **parser_options):
+        self.chrome_binary_path = chrome_binary_path
+        self.workers = max(1, workers)
+        self.parser_options = parser_options
+        self.retries = parser_options.get('retries', YearScraper.retries)
+        self.failed_years = {}
+        self.on_year_done = None
+
+    def _browser(self):
+        return EuromilhoesParser(self.chrome_binary_path, reuse_browser=False, **self.parser_options)
+
+    def extract_year(self, year):
+        """One year on a browser of its own (extract_years shares one browser per worker)"""
+        parser = self._browser()
+        try:
+            return parser.extract_year(year)
+        finally:
+            parser.close()
+
+    def _worker(self, years, results, lock):
+        """Drains the year queue on one browser; errors outside the per-year retries end the worker"""
+        parser = self._browser()
+        parser.on_year_done = self.on_year_done
+        try:
+            while True:
+                try:
+                    year = years.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    year_results = parser.extract_year_with_retries(year)
+                except Exception as e:
+                    with lock:
+                        self.failed_years[year] = f"{type(e).__name__}: {e}".strip()
+                    raise
+                with lock:
+                    results[year] = year_results
+                    if year in parser.failed_years:
+                        self.failed_years[year] = parser.failed_years[year]
+        finally:
+            parser.close()
+
+    def extract_years(self, years):
+        years = list(years)
+        queued = queue.Queue()
+        for year in years:
+            queued.put(year)
+        results, lock = {}, threading.Lock()
+        self.failed_years = {}
+
+        workers = min(self.workers, len(years))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(self._worker, queued, results, lock) for _ in range(workers)]
+        worker_error = None
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                worker_error = f"{type(e).__name__}: {e}".strip()
+                log_error(f"Worker de scraping falhou: {worker_error}")
+
+        # Years left in the queue when every worker had failed carry the last worker error
+        for year in years:
+            if year not in results:
+                self.failed_years.setdefault(year, worker_error or "Nenhum worker disponivel")
+        # Years finish out of order; extract_all_years merges them back chronologically
+        return {year: results[year] for year in sorted(results) if year not in self.failed_years}
+
+    def close(self):
+        pass
+
+def frequency_stats(values, max_value, recent_window=30):
+    """Per-value counts, last draw index, gap sums and recent hits from a draws x k block"""
+    values = np.asarray(values)
+    total_draws = len(values)
+    counts = np.bincount(values.ravel(), minlength=max_value + 1)[1:max_value + 1].astype(np.int64)
+    last_draw = np.full(max_value, -1, dtype=np.int64)
+    gap_sum = np.zeros(max_value, dtype=np.int64)
+    very_recent = np.zeros(max_value, dtype=np.int64)
+
+    if total_draws > 0:
+        flat = values.ravel()
+        rows = np.repeat(np.arange(total_draws, dtype=np.int64), values.shape[1])
+        # Fancy assignment keeps the last write per index: forward pass gives the
+        # last occurrence, reversed pass the first one
+        last_seen = np.full(max_value + 1, -1, dtype=np.int64)
+        last_seen[flat] = rows
+        first_seen = np.full(max_value + 1, -1, dtype=np.int64)
+        first_seen[flat[::-1]] = rows[::-1]
+        last_draw = last_seen[1:]
+        # Consecutive gaps telescope: their sum is last - first occurrence
+        gap_sum = np.where(counts > 0, last_draw - first_seen[1:], 0)
+        recent = values[max(0, total_draws - recent_window):].ravel()
+        very_recent = np.bincount(recent, minlength=max_value + 1)[1:max_value + 1].astype(np.int64)
+
+    return {
+        'count': counts,
+        'lastDraw': last_draw,
+        'gapSum': gap_sum,
+        'gapCount': np.maximum(counts - 1, 0),
+        'veryRecent': very_recent,
+    }
+
+def build_analysis_state(draws, recent_window=30):
+    """Full pass over the history into a state that apply_draws can extend"""
+    draws = as_draws(draws)
+    return {
+        'total': len(draws),
+        'recentWindow': recent_window,
+        'numbers': frequency_stats(draws['numbers'], 50, recent_window),
+        'stars': frequency_stats(draws['stars'], 12, recent_window),
+        'recentNumbers': np.array(draws['numbers'][len(draws) - min(recent_window, len(draws)):]),
+        'recentStars': np.array(draws['stars'][len(draws) - min(recent_window, len(draws)):]),
+        'cooccurrence': build_cooccurrence(draws),
+    }
+
+def _merge_stats(stats, delta, offset, recent_values, max_value):
+    seen = delta['count'] > 0
+    bridged = seen & (stats['lastDraw'] >= 0)
+    delta_first = delta['lastDraw'] - delta['gapSum'] + offset
+    return {
+        'count': stats['count'] + delta['count'],
+        'lastDraw': np.where(seen, delta['lastDraw'] + offset, stats['lastDraw']),
+        'gapSum': stats['gapSum'] + delta['gapSum'] + np.where(bridged, delta_first - stats['lastDraw'], 0),
+        'gapCount': stats['gapCount'] + delta['gapCount'] + bridged,
+        'veryRecent': np.bincount(recent_values.ravel(), minlength=max_value + 1)[1:max_value + 1].astype(np.int64),
+    }
+
+def apply_draws(state, new_draws):
+    """Absorb draws appended after state['total'] in O(len(new_draws))"""
+    new_draws = as_draws(new_draws)
+    if len(new_draws) == 0:
+        return state
+    window = state['recentWindow']
+    offset = state['total']
+    recent_numbers = np.concatenate([state['recentNumbers'], new_draws['numbers']])[-window:]
+    recent_stars = np.concatenate([state['recentStars'], new_draws['stars']])[-window:]
+    return {
+        'total': offset + len(new_draws),
+        'recentWindow': window,
+        'numbers': _merge_stats(state['numbers'], frequency_stats(new_draws['numbers'], 50, window), offset, recent_numbers, 50),
+        'stars': _merge_stats(state['stars'], frequency_stats(new_draws['stars'], 12, window), offset, recent_stars, 12),
+        'recentNumbers': recent_numbers,
+        'recentStars': recent_stars,
+        'cooccurrence': apply_cooccurrence(state['cooccurrence'], new_draws),
+    }
+
+def state_matches_draws(state, draws, recent_window=30):
+    """True when draws extends the history the state was built from (checked on the recent tail)"""
+    total = state['total']
+    if state['recentWindow'] != recent_window or len(draws) < total:
+        return False
+    tail = len(state['recentNumbers'])
+    return (np.array_equal(draws['numbers'][total - tail:total], state['recentNumbers'])
+            and np.array_equal(draws['stars'][total - tail:total], state['recentStars']))
+
+def _average_gaps(stats, default_gap):
+    gap_count = stats['gapCount']
+    avg_gap = np.where(gap_count > 0, stats['gapSum'] / np.maximum(gap_count, 1), default_gap)
+    return [g if c > 0 else default_gap for g, c in zip(avg_gap.tolist(), gap_count.tolist())]
+
+def calculate_numbers_analysis(numbers_stats, total_draws, default_gap=10):
     analysis = []
-    for num, data in numbers_data.items():
-        avg_gap = sum(data['gaps']) / len(data['gaps']) if data['gaps'] else default_gap
-        current_gap = total_draws - 1 - data['lastDraw']
+    avg_gaps = _average_gaps(numbers_stats, default_gap)
+    rows = zip(avg_gaps, numbers_stats['count'].tolist(), numbers_stats['lastDraw'].tolist(), numbers_stats['veryRecent'].tolist())
+    for num, (avg_gap, count, last_draw, very_recent) in enumerate(rows, start=1):
+        current_gap = total_draws - 1 - last_draw
         analysis.append({
             'number': num,
-            'freq': data['count'],
+            'freq': count,
             'overdueRatio': current_gap / avg_gap if avg_gap > 0 else 0,
             'isCritical': current_gap > avg_gap * 2 if avg_gap > 0 else False,
-            'isHot': data['veryRecent'] >= 2
+            'isHot': very_recent >= 2
         })
     return analysis
 
-def calculate_stars_analysis(stars_data, total_draws, default_gap=5):
+def calculate_stars_analysis(stars_stats, total_draws, default_gap=5):
     analysis = []
-    for star, data in stars_data.items():
-        avg_gap = sum(data['gaps']) / len(data['gaps']) if data['gaps'] else default_gap
-        current_gap = total_draws - 1 - data['lastDraw']
+    avg_gaps = _average_gaps(stars_stats, default_gap)
+    rows = zip(avg_gaps, stars_stats['lastDraw'].tolist(), stars_stats['veryRecent'].tolist())
+    for star, (avg_gap, last_draw, very_recent) in enumerate(rows, start=1):
+        current_gap = total_draws - 1 - last_draw
         analysis.append({
             'star': star,
             'overdueRatio': current_gap / avg_gap if avg_gap > 0 else 0,
             'isOverdue': current_gap > avg_gap * 1.5 if avg_gap > 0 else False,
-            'isHot': data['veryRecent'] >= 2
+            'isHot': very_recent >= 2
         })
     return analysis
 
-def analyze_and_generate_keys(all_draws_lines):
-    try:
-        numbers_data = initialize_frequency_data(50)
-        stars_data = initialize_frequency_data(12)
-
-        total_draws = len(all_draws_lines)
-        for index, line in enumerate(all_draws_lines):
-            main_nums, star_nums = parse_draw_line(line)
-            update_frequency_data(numbers_data, main_nums, index, total_draws)
-            update_frequency_data(stars_data, star_nums, index, total_draws)
-
-        numbers_analysis = calculate_numbers_analysis(numbers_data, total_draws)
-        stars_analysis = calculate_stars_analysis(stars_data, total_draws)
+def generate_strategic_keys(numbers_stats, stars_stats, total_draws):
+    numbers_analysis = calculate_numbers_analysis(numbers_stats, total_draws)
+    stars_analysis = calculate_stars_analysis(stars_stats, total_draws)
 
-        critical_nums = sorted([n for n in numbers_analysis if n['isCritical']], key=lambda x: x['overdueRatio'], reverse=True)
-        hot_nums = sorted([n for n in numbers_analysis if n['isHot']], key=lambda x: x['number'])
-        premium_nums = sorted([n for n in numbers_analysis if n['freq'] > (total_draws / 50 * 1.1)], key=lambda x: x['freq'], reverse=True)
-        overdue_stars = sorted([s for s in stars_analysis if s['isOverdue']], key=lambda x: x['overdueRatio'], reverse=True)
-        hot_stars = sorted([s for s in stars_analysis if s['isHot']], key=lambda x: x['star'])
+    critical_nums = sorted([n for n in numbers_analysis if n['isCritical']], key=lambda x: x['overdueRatio'], reverse=True)
+    hot_nums = sorted([n for n in numbers_analysis if n['isHot']], key=lambda x: x['number'])
+    premium_nums = sorted([n for n in numbers_analysis if n['freq'] > (total_draws / 50 * 1.1)], key=lambda x: x['freq'], reverse=True)
+    overdue_stars = sorted([s for s in stars_analysis if s['isOverdue']], key=lambda x: x['overdueRatio'], reverse=True)
+    hot_stars = sorted([s for s in stars_analysis if s['isHot']], key=lambda x: x['star'])
 
-        used_nums, used_stars, keys = set(), set(), {}
+    used_nums, used_stars, keys = set(), set(), {}
 
-        def generate_key(num_sources, star_sources):
-            key_nums, key_stars = [], []
-            temp_used_nums, temp_used_stars = set(), set()
+    def generate_key(num_sources, star_sources):
+        key_nums, key_stars = [], []
+        temp_used_nums, temp_used_stars = set(), set()
 
-            for source, count in num_sources:
-                for num_data in source:
-                    if len(key_nums) >= count:
-                        break
-                    num = num_data['number']
-                    if num not in used_nums and num not in temp_used_nums:
-                        key_nums.append(num)
-                        temp_used_nums.add(num)
-
-            for source, count in star_sources:
-                for star_data in source:
-                    if len(key_stars) >= count:
-                        break
-                    star = star_data['star']
-                    if star not in used_stars and star not in temp_used_stars:
-                        key_stars.append(star)
-                        temp_used_stars.add(star)
-
-            all_available_nums = premium_nums + numbers_analysis
-            all_available_stars = hot_stars + stars_analysis
-
-            while len(key_nums) < 5:
-                num = None
-                for n in all_available_nums:
-                    if n['number'] not in used_nums and n['number'] not in temp_used_nums:
-                        num = n['number']
-                        break
-                if num is None:
-                    for i in range(1, 51):
-                        if i not in used_nums and i not in temp_used_nums:
-                            num = i
-                            break
-                if num is not None:
+        for source, count in num_sources:
+            for num_data in source:
+                if len(key_nums) >= count:
+                    break
+                num = num_data['number']
+                if num not in used_nums and num not in temp_used_nums:
                     key_nums.append(num)
                     temp_used_nums.add(num)
 
-            while len(key_stars) < 2:
-                star = None
-                for s in all_available_stars:
-                    if s['star'] not in used_stars and s['star'] not in temp_used_stars:
-                        star = s['star']
-                        break
-                if star is None:
-                    for i in range(1, 13):
-                        if i not in used_stars and i not in temp_used_stars:
-                            star = i
-                            break
-                if star is not None:
+        for source, count in star_sources:
+            for star_data in source:
+                if len(key_stars) >= count:
+                    break
+                star = star_data['star']
+                if star not in used_stars and star not in temp_used_stars:
                     key_stars.append(star)
                     temp_used_stars.add(star)
 
-            used_nums.update(key_nums)
-            used_stars.update(key_stars)
-            return {'numbers': sorted(key_nums), 'stars': sorted(key_stars)}
+        all_available_nums = premium_nums + numbers_analysis
+        all_available_stars = hot_stars + stars_analysis
+
+        while len(key_nums) < 5:
+            num = None
+            for n in all_available_nums:
+                if n['number'] not in used_nums and n['number'] not in temp_used_nums:
+                    num = n['number']
+                    break
+            if num is None:
+                for i in range(1, 51):
+                    if i not in used_nums and i not in temp_used_nums:
+                        num = i
+                        break
+            if num is not None:
+                key_nums.append(num)
+                temp_used_nums.add(num)
+
+        while len(key_stars) < 2:
+            star = None
+            for s in all_available_stars:
+                if s['star'] not in used_stars and s['star'] not in temp_used_stars:
+                    star = s['star']
+                    break
+            if star is None:
+                for i in range(1, 13):
+                    if i not in used_stars and i not in temp_used_stars:
+                        star = i
+                        break
+            if star is not None:
+                key_stars.append(star)
+                temp_used_stars.add(star)
+
+        used_nums.update(key_nums)
+        used_stars.update(key_stars)
+        return {'numbers': sorted(key_nums), 'stars': sorted(key_stars)}
+
+    keys['principal'] = generate_key([(critical_nums, 2), (premium_nums, 5)], [(overdue_stars, 2)])
+    keys['secundaria'] = generate_key([(hot_nums, 3), (premium_nums, 5)], [(hot_stars, 2)])
+    keys['hibrida'] = generate_key([(critical_nums, 1), (hot_nums, 3), (premium_nums, 5)], [(overdue_stars, 1), (hot_stars, 2)])
+    return keys
+
+def _affinity_pick(pairs, counts, used, size):
+    # Greedy: the first pick is the most frequent unused value, each next one maximises co-occurrences
+    # with the values already chosen (ties broken by frequency); values in `used` are never picked
+    excluded = np.asarray(sorted(used), dtype=np.intp) - 1
+    chosen = []
+    while len(chosen) < size:
+        scores = affinity_scores(pairs, chosen) * (int(counts.max()) + 1) + counts
+        scores[excluded] = -1
+        scores[np.asarray(chosen, dtype=np.intp) - 1] = -1
+        chosen.append(int(np.argmax(scores)) + 1)
+    return chosen
+
+def generate_affinity_key(numbers_stats, stars_stats, cooccurrence, used_nums=(), used_stars=()):
+    """Key grown along the strongest pair co-occurrences, without the numbers/stars of the other keys"""
+    numbers = _affinity_pick(cooccurrence['numberPairs'], numbers_stats['count'], used_nums, 5)
+    stars = _affinity_pick(cooccurrence['starPairs'], stars_stats['count'], used_stars, 2)
+    return {'numbers': sorted(numbers), 'stars': sorted(stars)}
+
+@instrumented('analyze_and_generate_keys')
+def analyze_and_generate_keys(all_draws_lines):
+    try:
+        draws = as_draws(all_draws_lines)
+        total_draws = len(draws)
+        numbers_stats = frequency_stats(draws['numbers'], 50)
+        stars_stats = frequency_stats(draws['stars'], 12)
+        return generate_strategic_keys(numbers_stats, stars_stats, total_draws)
+    except Exception as e:
+        print(f"Error during analysis: {e}", file=sys.stderr)
+        return None
 
-        keys['principal'] = generate_key([(critical_nums, 2), (premium_nums, 5)], [(overdue_stars, 2)])
-        keys['secundaria'] = generate_key([(hot_nums, 3), (premium_nums, 5)], [(hot_stars, 2)])
-        keys['hibrida'] = generate_key([(critical_nums, 1), (hot_nums, 3), (premium_nums, 5)], [(overdue_stars, 1), (hot_stars, 2)])
+@instrumented('generate_keys_from_state')
+def generate_keys_from_state(state, override_keys=None):
+    """Greedy keys (replaced by override_keys where given) plus the affinity key, which reuses none of their values"""
+    try:
+        keys = generate_strategic_keys(state['numbers'], state['stars'], state['total'])
+        keys.update(override_keys or {})
+        if state.get('cooccurrence') is not None and state['total'] > 0:
+            used_nums = {n for key in keys.values() for n in key['numbers']}
+            used_stars = {s for key in keys.values() for s in key['stars']}
+            keys['afinidade'] = generate_affinity_key(state['numbers'], state['stars'], state['cooccurrence'],
+                                                      used_nums, used_stars)
         return keys
     except Exception as e:
         print(f"Error during analysis: {e}", file=sys.stderr)
@@ -1,16 +1,96 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
 import os
 import sys
-from flask import Flask, jsonify, send_from_directory
+import threading
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 import json
+import gzip
+import hashlib
 from datetime import datetime
+from collections import OrderedDict
 from functools import lru_cache
-from utils import colored_print, parse_draw_line, log_error, log_success, log_warning, log_info, log_cache
-from logic import analyze_and_generate_keys, EuromilhoesParser, setup_headless_chrome_linux
+import numpy as np
+from utils import colored_print, log_error, log_success, log_warning, log_info, log_cache
+from logic import (EuromilhoesParser, ParallelEuromilhoesParser, HttpEuromilhoesParser, setup_headless_chrome_linux,
+                   build_analysis_state,
+                   apply_draws, state_matches_draws, generate_keys_from_state)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from jobs import JobManager, SingleFlight
+from shared_cache import SharedAnalysis, file_lock
+from metrics import timed, instrumented, histogram, counter, render_metrics, OPERATION_SECONDS
+from cooccurrence import top_pairs, top_triples, companions
+from backtest import run_backtest
+from combination_search import PROFILES, LinearScorer, generate_search_keys, top_keys
+from synthetic import generate_draws
+from draw_index import build_draw_index, resolve_window, window_stats, overdue_ranking
+from storage import (as_draws, parse_draws, draws_to_lines, draws_by_year, empty_draws, chronological,
+                     has_full_dates, format_draw_date, parse_draw_date, is_extension_of, write_json_atomic,
+                     save_draw_store, save_draw_meta, load_draw_meta, meta_path, new_history_id, load_history, append_draws,
+                     save_analysis_state, load_analysis_state, load_manifest, save_manifest, year_content_hash)
 
 static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web')
 app = Flask(__name__, static_folder=static_dir)
 
-_analysis_cache = {'data': None, 'timestamp': None}
+_analysis_cache = {'data': None, 'timestamp': None, 'version': None, 'etag': None, 'bodies': None}
+_data_version_cache = {'identity': None, 'version': None}
+_draw_index_cache = {'version': None, 'index': None}
+_backtest_cache = OrderedDict()
+_backtest_lock = threading.Lock()
+_search_keys_cache = {'version': None, 'keys': None}
+_cooccurrence_cache = {'version': None, 'entry': None}
+_top_keys_cache = {'version': None, 'keys': {}}
+_top_keys_flight = SingleFlight()
+_analysis_history = OrderedDict()
+_analysis_deltas = {'etag': None, 'bodies': {}}
+_analysis_lock = threading.Lock()
+_analysis_flight = SingleFlight()
+_revalidation_lock = threading.Lock()
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+OPERATION_SECONDS.observe(IMPORT_SECONDS, operation='startup_imports')
+WARM_START = os.environ.get('EUROMILHOES_WARM_START', '1') == '1'
+_startup = {'warmSeconds': None, 'firstResponse': None}
+
+REQUEST_SECONDS = histogram('euromilhoes_http_request_seconds', 'Duracao dos pedidos HTTP por endpoint')
+ANALYSIS_CACHE_REQUESTS = counter('euromilhoes_analysis_cache_total',
+                                  'Consultas ao cache de /api/analysis (hit, miss, coalesced, shared, stale)')
+PROFILING_ENABLED = os.environ.get('EUROMILHOES_PROFILING') == '1'
+PROFILES_DIR = os.path.join(os.path.dirname(__file__), 'data', 'profiles')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get('cprofile') == '1':
+        import cProfile
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILES_DIR, f"{request.endpoint}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+        profiler.dump_stats(profile_path)
+        response.headers['X-Profile-File'] = os.path.relpath(profile_path, os.path.dirname(os.path.abspath(__file__)))
+        log_info(f"Perfil gravado em {profile_path}")
+    if 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=request.endpoint or 'unknown',
+                                method=request.method, status=response.status_code)
+        if _startup['firstResponse'] is None and request.path.startswith('/api/'):
+            _startup['firstResponse'] = {
+                'endpoint': request.path,
+                'requestSeconds': round(time.perf_counter() - g.request_started, 4),
+                'sinceStartSeconds': round(time.perf_counter() - _IMPORT_STARTED, 4),
+            }
+            log_info(f"Primeira resposta da API ({request.path}): {_startup['firstResponse']['requestSeconds'] * 1000:.1f} ms, "
+                     f"{_startup['firstResponse']['sinceStartSeconds']:.2f}s apos o arranque")
+    return response
 
 @app.route('/')
 def dashboard():
@@ -34,8 +114,29 @@ def image_files(filename):
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 CACHE_FILE = os.path.join(DATA_DIR, 'cache.json')
+DRAWS_FILE = os.path.join(DATA_DIR, 'draws.npy')
+ANALYSIS_STATE_FILE = os.path.join(DATA_DIR, 'analysis_state.npz')
+MANIFEST_FILE = os.path.join(DATA_DIR, 'manifest.json')
+SHARED_ANALYSIS_FILE = os.path.join(DATA_DIR, 'analysis.bin')
+UPDATE_LOCK_FILE = os.path.join(DATA_DIR, 'update.lock')
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+JOURNAL_COMPACT_EVERY = 64
+NEW_DRAWS_EVENT_LIMIT = 50
+SSE_KEEPALIVE_SECONDS = 15
+SSE_POLL_SECONDS = 1
+ANALYSIS_STALE_SECONDS = 60
+ANALYSIS_HISTORY_LIMIT = 8
+# Incrementar quando os campos de /api/analysis mudam
+ANALYSIS_SCHEMA = 2
+BACKTEST_CACHE_LIMIT = 16
+FIRST_YEAR = 2004
+VALIDATOR_KEYS = ('etag', 'lastModified')
+SCRAPE_WORKERS = int(os.environ.get('EUROMILHOES_SCRAPE_WORKERS', '4'))
+SCRAPER_BACKEND = os.environ.get('EUROMILHOES_SCRAPER', 'http')
+KEY_ENGINE = os.environ.get('EUROMILHOES_KEY_ENGINE', 'search')
 
 os.makedirs(DATA_DIR, exist_ok=True)
+shared_analysis = SharedAnalysis(SHARED_ANALYSIS_FILE)
 
 def load_cache():
     """Carrega dados do cache em disco"""
@@ -48,222 +149,701 @@ def load_cache():
             log_error(f"Erro ao carregar cache: {e}")
     return None
 
+def _cache_meta(total, is_real_data=False, year_start=None, year_end=None, history_id=None):
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'total': total,
+        'source': 'scraping' if is_real_data else 'simulated',
+        'last_scraping': datetime.now().isoformat() if is_real_data else None,
+        'year_range': {
+            'start': year_start or 2004,
+            'end': year_end or datetime.now().year
+        } if is_real_data else None,
+        'history_id': history_id or new_history_id(),
+    }
+
+def export_cache_json(draws, meta):
+    """Exporta o histórico para o cache.json (formato de importação/exportação), com rename atómico"""
+    cache_data = {'draws': draws_to_lines(draws), 'dates': [format_draw_date(d) for d in draws['date'].tolist()], **meta}
+    write_json_atomic(CACHE_FILE, cache_data, indent=2)
+
 def save_cache(data, is_real_data=False, year_start=None, year_end=None):
-    """Salva dados no cache em disco"""
+    """Salva um snapshot completo em disco (armazenamento binário + exportação JSON)"""
     try:
-        cache_data = {
-            'draws': data,
-            'timestamp': datetime.now().isoformat(),
-            'total': len(data),
-            'source': 'scraping' if is_real_data else 'simulated',
-            'last_scraping': datetime.now().isoformat() if is_real_data else None,
-            'year_range': {
-                'start': year_start or 2004,
-                'end': year_end or datetime.now().year
-            } if is_real_data else None
-        }
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        draws = as_draws(data)
+        meta = _cache_meta(len(draws), is_real_data, year_start, year_end)
+        export_cache_json(draws, meta)
+        save_draw_store(draws, DRAWS_FILE, meta)
         source_text = 'real' if is_real_data else 'simulado'
         year_text = f" ({year_start}-{year_end})" if year_start and year_end else ""
-        log_cache(f"Salvo: {len(data)} sorteios ({source_text}){year_text}")
+        log_cache(f"Salvo: {len(draws)} sorteios ({source_text}){year_text}")
         return True
     except Exception as e:
         log_error(f"Erro ao salvar cache: {e}")
         return False
 
-def get_simulated_data():
-    """Gera dados simulados mais realistas"""
-    import random
-    data = []
-    for _ in range(1868):  # Número aproximado de sorteios desde 2004
-        numbers = sorted(random.sample(range(1, 51), 5))
-        stars = sorted(random.sample(range(1, 13), 2))
-        data.append(f"{' '.join(map(str, numbers))} + {' '.join(map(str, stars))}")
-    return data
+def append_cache(new_draws, is_real_data=False, year_start=None, year_end=None):
+    """Acrescenta sorteios novos ao journal; compacta num snapshot a cada JOURNAL_COMPACT_EVERY entradas"""
+    try:
+        previous_total = len(load_draws())
+        meta = _cache_meta(previous_total + len(new_draws), is_real_data, year_start, year_end, current_history_id())
+        journal_size = append_draws(DRAWS_FILE, new_draws, meta)
+        log_cache(f"Acrescentados: {len(new_draws)} sorteios (journal com {journal_size})")
+        if journal_size >= JOURNAL_COMPACT_EVERY:
+            draws = load_history(DRAWS_FILE)
+            export_cache_json(draws, meta)
+            save_draw_store(draws, DRAWS_FILE, meta)
+            log_cache(f"Journal compactado: {len(draws)} sorteios")
+        return True
+    except Exception as e:
+        log_error(f"Erro ao acrescentar ao cache: {e}")
+        return False
 
-def get_cache_year_range(cache_data):
-    """Analisa o cache e descobre que anos já temos"""
-    if not cache_data or 'draws' not in cache_data or not cache_data['draws']:
-        return None, None
+def store_history(draws, is_real_data=False, year_start=None, year_end=None):
+    """Grava o histórico: só acrescenta ao journal se estender o existente, senão reescreve o snapshot"""
+    existing = load_draws()
+    same_source = (load_draw_meta(DRAWS_FILE) or {}).get('source') == ('scraping' if is_real_data else 'simulated')
+    if existing is not None and same_source and is_extension_of(existing, draws):
+        new_draws = draws[len(existing):]
+        if len(new_draws) == 0:
+            meta = _cache_meta(len(draws), is_real_data, year_start, year_end, current_history_id())
+            save_draw_meta(DRAWS_FILE, meta, len(draws))
+            return True
+        return append_cache(new_draws, is_real_data, year_start, year_end)
+    return save_cache(draws, is_real_data, year_start, year_end)
 
-    if 'year_range' in cache_data:
-        return cache_data['year_range'].get('start'), cache_data['year_range'].get('end')
+def current_history_id():
+    """Identificador do snapshot atual (muda quando o histórico é reescrito, não nos acrescentos)"""
+    meta = load_draw_meta(DRAWS_FILE)
+    if meta is None:
+        return None
+    if not meta.get('history_id'):
+        # Metadados anteriores ao identificador: atribui um, o estado de análise é reconstruído uma vez
+        meta['history_id'] = new_history_id()
+        save_draw_meta(DRAWS_FILE, meta, meta.get('total', 0))
+    return meta['history_id']
 
-    return 2004, datetime.now().year
+@instrumented('load_draws')
+def load_draws():
+    """Carrega os sorteios (snapshot + journal), importando o cache.json se for mais recente"""
+    json_mtime = os.path.getmtime(CACHE_FILE) if os.path.exists(CACHE_FILE) else None
+    if os.path.exists(DRAWS_FILE) and (json_mtime is None or json_mtime <= os.path.getmtime(DRAWS_FILE)):
+        try:
+            return load_history(DRAWS_FILE)
+        except Exception as e:
+            log_error(f"Erro ao carregar armazenamento binario: {e}")
 
-def scrape_intelligent():
-    """Scraping INTELIGENTE - analisa cache e busca apenas o necessário"""
+    cache_data = load_cache()
+    if not cache_data or 'draws' not in cache_data:
+        return None
     try:
-        current_year = datetime.now().year
-        cache_data = load_cache()
+        dates = None
+        if cache_data.get('dates') and len(cache_data['dates']) == len(cache_data['draws']):
+            dates = [parse_draw_date(d) for d in cache_data['dates']]
+        draws, report = parse_draws(cache_data['draws'], dates=dates)
+        log_rejected_lines(report, 'cache.json')
+        meta = {k: v for k, v in cache_data.items() if k not in ('draws', 'dates')}
+        meta['history_id'] = new_history_id()
+        save_draw_store(draws, DRAWS_FILE, meta)
+        log_cache(f"Importado cache.json: {len(draws)} sorteios")
+        return load_history(DRAWS_FILE)
+    except Exception as e:
+        log_error(f"Erro ao importar cache.json: {e}")
+        return None
 
-        if not cache_data or 'draws' not in cache_data or len(cache_data['draws']) == 0:
-            log_warning("Cache vazio, primeira execucao")
-            log_info("Buscando todos os sorteios desde 2004...")
+def get_simulated_data(count=1868, seed=None, skew=0.0):
+    """Gera dados simulados com o gerador vetorizado (seed fixa para históricos reprodutíveis)"""
+    # 1868: número aproximado de sorteios desde 2004
+    return draws_to_lines(generate_draws(count, seed, skew))
 
-            chrome_binary_path = setup_headless_chrome_linux()
-            parser = EuromilhoesParser(chrome_binary_path=chrome_binary_path, reuse_browser=True)
-            all_draws = parser.extract_all_years(2004, current_year)
-            parser.close()
+def get_cache_year_range(draws):
+    """Descobre que anos já temos a partir das datas dos sorteios"""
+    if draws is None or len(draws) == 0:
+        return None, None
+    years = [year for year in draws_by_year(draws) if year]
+    if not years:
+        meta = load_draw_meta(DRAWS_FILE) or {}
+        year_range = meta.get('year_range') or {}
+        return year_range.get('start', FIRST_YEAR), year_range.get('end', datetime.now().year)
+    return min(years), max(years)
 
-            if all_draws and len(all_draws) > 0:
-                log_success(f"Scraping completo: {len(all_draws)} sorteios obtidos")
-                return all_draws, 2004, current_year
-            else:
-                log_error("Scraping falhou, usando dados simulados")
-                return get_simulated_data(), None, None
+def years_to_fetch(manifest, current_year, undated_years=()):
+    """Anos em falta, parciais ou sem datas completas, mais o ano atual (ainda em curso)"""
+    return [
+        year for year in range(FIRST_YEAR, current_year + 1)
+        if year == current_year or year in undated_years or manifest.get(year, {}).get('status') != 'complete'
+    ]
 
-        existing_draws = cache_data['draws']
-        cache_start, cache_end = get_cache_year_range(cache_data)
+def log_rejected_lines(report, source):
+    """Avisa das linhas de sorteio rejeitadas pelo parser (mostra as primeiras)"""
+    if not report['rejected']:
+        return
+    log_warning(f"{source}: {len(report['rejected'])} linhas invalidas ignoradas")
+    for entry in report['rejected'][:5]:
+        log_warning(f"  linha {entry['position']} ({entry['reason']}): {entry['line']!r}")
 
-        log_cache(f"Cache encontrado: {len(existing_draws)} sorteios ({cache_start}-{cache_end})")
-        log_info(f"Verificando dados de {current_year}...")
+def year_draws(year, rows):
+    """Sorteios de um ano a partir das linhas (date, draw line), por ordem cronológica e sem datas repetidas"""
+    dates = [date or year * 10000 for date, _ in rows]
+    draws, report = parse_draws([line for _, line in rows], dates=dates)
+    log_rejected_lines(report, f"Ano {year}")
+    return chronological(draws)
 
-        chrome_binary_path = setup_headless_chrome_linux()
-        parser = EuromilhoesParser(chrome_binary_path=chrome_binary_path, reuse_browser=True)
-        new_draws = parser.extract_all_years(current_year, current_year)
-        parser.close()
+def update_manifest(manifest, fetched, current_year, validators):
+    """Atualiza o manifesto com os anos obtidos (os anos com falha ficam como estavam)"""
+    manifest = {year: dict(entry) for year, entry in manifest.items()}
+    fetched_at = datetime.now().isoformat()
+    for year, rows in fetched.items():
+        entry = manifest.setdefault(year, {})
+        entry['fetchedAt'] = fetched_at
+        if rows is None:
+            continue
+        entry.update({
+            'status': 'complete' if year < current_year and rows else 'partial',
+            'draws': len(rows),
+            'hash': year_content_hash(rows),
+        })
+        # Só os validadores HTTP: o estado, a contagem e o hash acabados de calcular prevalecem
+        entry.update({key: value for key, value in (validators.get(year) or {}).items() if key in VALIDATOR_KEYS and value})
+    return manifest
 
-        if not new_draws or len(new_draws) == 0:
-            log_warning("Nenhum dado novo encontrado")
-            return existing_draws, cache_start, cache_end
+def create_parser(workers=1, progress=None, validators=None):
+    """Cria o parser configurado (EUROMILHOES_SCRAPER: 'http' com fallback Selenium, ou 'selenium')"""
+    if SCRAPER_BACKEND == 'http':
+        parser = HttpEuromilhoesParser(workers=workers, validators=validators)
+    elif workers > 1:
+        parser = ParallelEuromilhoesParser(chrome_binary_path=setup_headless_chrome_linux(), workers=workers)
+    else:
+        parser = EuromilhoesParser(chrome_binary_path=setup_headless_chrome_linux(), reuse_browser=True)
+    if progress is not None:
+        parser.on_year_done = progress.record_year
+    return parser
 
-        existing_set = set(existing_draws)
-        new_unique = [d for d in new_draws if d not in existing_set]
+def scrape_intelligent(progress=None):
+    """Scraping INTELIGENTE - usa o manifesto por ano e busca apenas anos em falta, parciais ou o atual"""
+    existing = None
+    try:
+        current_year = datetime.now().year
+        existing = load_draws()
+        existing_by_year = draws_by_year(existing) if existing is not None and len(existing) > 0 else {}
+        manifest = load_manifest(MANIFEST_FILE)
+        legacy = 0 in existing_by_year
 
-        if len(new_unique) == 0:
-            log_warning("Todos os dados ja estavam no cache")
-            return existing_draws, cache_start, cache_end
+        if not existing_by_year:
+            log_warning("Cache vazio, primeira execucao")
+            manifest = {}
+        elif legacy:
+            log_warning(f"Cache sem anos conhecidos ({len(existing)} sorteios) - a refazer o historico completo")
+            manifest = {}
+        else:
+            cache_start, cache_end = get_cache_year_range(existing)
+            log_cache(f"Cache encontrado: {len(existing)} sorteios ({cache_start}-{cache_end})")
 
-        combined_draws = existing_draws + new_unique
-        combined_draws.sort()
+        undated_years = [year for year, draws in existing_by_year.items() if year and not has_full_dates(draws)]
+        years = years_to_fetch(manifest, current_year, undated_years)
+        log_info(f"Anos a obter: {', '.join(map(str, years))}")
+        if progress is not None:
+            progress.plan_years(years)
 
-        log_success(f"{len(new_unique)} novos sorteios adicionados")
-        log_success(f"Total: {len(combined_draws)} sorteios")
+        validators = {year: {key: manifest[year].get(key) for key in VALIDATOR_KEYS}
+                      for year in years if year in manifest and year in existing_by_year}
+        parser = create_parser(workers=SCRAPE_WORKERS if len(years) > 1 else 1, progress=progress,
+                               validators=validators)
+        try:
+            fetched = parser.extract_years(years)
+        finally:
+            parser.close()
+        if parser.failed_years:
+            log_warning(f"Anos com falha: {', '.join(map(str, sorted(parser.failed_years)))}")
+
+        if not existing_by_year and not any(fetched.values()):
+            log_error("Scraping falhou, usando dados simulados")
+            return get_simulated_data(), None, None, None
+        if legacy and parser.failed_years:
+            log_warning(f"Historico incompleto, mantendo cache existente: {len(existing)} sorteios")
+            cache_start, cache_end = get_cache_year_range(existing)
+            return existing, cache_start, cache_end, None
+
+        merged_by_year = {year: draws for year, draws in existing_by_year.items() if year}
+        for year, rows in fetched.items():
+            if rows is None:
+                log_cache(f"{year}: sem alteracoes (304)")
+                continue
+            if manifest.get(year, {}).get('hash') == year_content_hash(rows) and year in merged_by_year:
+                continue
+            merged_by_year[year] = year_draws(year, rows)
+        # Anos por ordem e cada ano por data: a análise de intervalos depende da cronologia
+        combined = np.concatenate([merged_by_year[year] for year in sorted(merged_by_year)]) if merged_by_year else empty_draws()
+
+        previous_total = 0 if legacy or existing is None else len(existing)
+        if len(combined) > previous_total:
+            log_success(f"{len(combined) - previous_total} novos sorteios adicionados")
+        else:
+            log_warning("Nenhum dado novo encontrado")
+        log_success(f"Total: {len(combined)} sorteios")
 
-        return combined_draws, cache_start or 2004, current_year
+        new_manifest = update_manifest(manifest, fetched, current_year, getattr(parser, 'validators', {}))
+        return combined, min(merged_by_year, default=None), max(merged_by_year, default=None), new_manifest
 
     except Exception as e:
         log_error(f"Erro no scraping: {e}")
         import traceback
         traceback.print_exc()
 
-        cache_data = load_cache()
-        if cache_data and 'draws' in cache_data and len(cache_data['draws']) > 0:
-            log_warning(f"Mantendo cache existente: {len(cache_data['draws'])} sorteios")
-            cache_start, cache_end = get_cache_year_range(cache_data)
-            return cache_data['draws'], cache_start, cache_end
+        if existing is not None and len(existing) > 0:
+            log_warning(f"Mantendo cache existente: {len(existing)} sorteios")
+            cache_start, cache_end = get_cache_year_range(existing)
+            return existing, cache_start, cache_end, None
         else:
             log_warning("Gerando dados simulados")
-            return get_simulated_data(), None, None
+            return get_simulated_data(), None, None, None
 
-def get_historical_data(force_refresh=False):
-    """Função para obter dados históricos - usa cache em disco"""
+def get_historical_data(force_refresh=False, progress=None):
+    """Função para obter dados históricos - usa o armazenamento binário em disco"""
     if force_refresh:
         log_info("Atualizacao de dados solicitada")
-        data, year_start, year_end = scrape_intelligent()
-        save_cache(data, is_real_data=True, year_start=year_start, year_end=year_end)
-        return data
+        data, year_start, year_end, manifest = scrape_intelligent(progress=progress)
+        if store_history(as_draws(data), is_real_data=True, year_start=year_start, year_end=year_end) and manifest is not None:
+            save_manifest(manifest, MANIFEST_FILE)
+        return load_draws()
 
-    cache_data = load_cache()
-    if cache_data and 'draws' in cache_data:
-        return cache_data['draws']
+    draws = load_draws()
+    if draws is not None:
+        return draws
 
-    log_warning("Cache nao encontrado - gerando dados simulados iniciais...")
-    data = get_simulated_data()
-    save_cache(data, is_real_data=False)
-    log_info("Use 'Atualizar Dados' para obter dados reais")
-    return data
+    # Vários workers a arrancar sem dados: só o primeiro gera o histórico simulado
+    with file_lock(UPDATE_LOCK_FILE):
+        draws = load_draws()
+        if draws is not None:
+            return draws
+        log_warning("Cache nao encontrado - gerando dados simulados iniciais...")
+        data = get_simulated_data()
+        save_cache(data, is_real_data=False)
+        log_info("Use 'Atualizar Dados' para obter dados reais")
+        return load_draws()
 
-def _is_cache_valid(cache_ttl_seconds=60):
-    """Check if cached analysis is still valid (TTL in seconds)"""
-    if _analysis_cache['data'] is None or _analysis_cache['timestamp'] is None:
-        return False
-    age = (datetime.now() - _analysis_cache['timestamp']).total_seconds()
-    return age < cache_ttl_seconds
+@instrumented('get_analysis_state')
+def get_analysis_state(draws):
+    """Estado de análise incremental - aplica apenas os sorteios novos, reconstrói se o histórico foi reescrito"""
+    history_id = current_history_id()
+    state = None
+    try:
+        state = load_analysis_state(ANALYSIS_STATE_FILE)
+    except Exception as e:
+        log_error(f"Erro ao carregar estado de analise: {e}")
 
-@app.route('/api/analysis')
-def get_analysis():
-    """API endpoint para obter dados de análise - usa cache em memória com TTL 60s"""
-    global _analysis_cache
+    # O estado só é estendido sobre o mesmo snapshot: uma reescrita pode manter o total e a cauda
+    if state is not None and state['historyId'] == history_id and state_matches_draws(state, draws):
+        if state['total'] == len(draws):
+            return state
+        new_count = len(draws) - state['total']
+        state = apply_draws(state, draws[state['total']:])
+        log_cache(f"Estado de analise atualizado: +{new_count} sorteios")
+    else:
+        state = build_analysis_state(draws)
+        log_cache(f"Estado de analise reconstruido: {len(draws)} sorteios")
 
-    if _is_cache_valid(cache_ttl_seconds=60):
-        return jsonify(_analysis_cache['data'])
+    try:
+        save_analysis_state(state, ANALYSIS_STATE_FILE, history_id)
+    except Exception as e:
+        log_error(f"Erro ao salvar estado de analise: {e}")
+    return state
 
+def current_data_version():
+    """Versão dos dados [total, timestamp] do ficheiro meta - relido só quando o ficheiro muda"""
     try:
-        historical_data = get_historical_data(force_refresh=False)
-        strategic_keys = analyze_and_generate_keys(historical_data)
-        
-        if not strategic_keys:
-            strategic_keys = {
-                'principal': {'numbers': [19, 23, 28, 34, 44], 'stars': [2, 11]},
-                'secundaria': {'numbers': [1, 3, 4, 21, 42], 'stars': [1, 3]},
-                'hibrida': {'numbers': [6, 8, 10, 29, 50], 'stars': [4, 10]}
-            }
+        st = os.stat(meta_path(DRAWS_FILE))
+    except FileNotFoundError:
+        return None
+    identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if _data_version_cache['identity'] != identity:
+        meta = load_draw_meta(DRAWS_FILE) or {}
+        _data_version_cache['version'] = [meta.get('total'), meta.get('timestamp')]
+        _data_version_cache['identity'] = identity
+    return _data_version_cache['version']
 
-        number_frequencies = [0] * 50
-        star_frequencies = [0] * 12
+def _is_cache_valid(entry, version):
+    """Check if a cached analysis entry was computed for the given data version"""
+    return entry['bodies'] is not None and version is not None and entry['version'] == version
 
-        for draw in historical_data:
-            try:
-                numbers, stars = parse_draw_line(draw)
-                for n in numbers:
-                    if 1 <= n <= 50:
-                        number_frequencies[n-1] += 1
-                for s in stars:
-                    if 1 <= s <= 12:
-                        star_frequencies[s-1] += 1
-            except ValueError:
-                continue
+def analysis_snapshot():
+    """Cópia consistente da entrada do cache de análise (os campos mudam sempre em conjunto)"""
+    with _analysis_lock:
+        return dict(_analysis_cache)
 
-        top_numbers = [{'number': i+1, 'frequency': freq} for i, freq in enumerate(number_frequencies)]
-        top_numbers.sort(key=lambda x: x['frequency'], reverse=True)
-        top_numbers = top_numbers[:5]
-
-        import random
-        overdue_numbers = []
-        used_numbers = set()
-        while len(overdue_numbers) < 5:
-            num = random.randint(1, 50)
-            if num not in used_numbers:
-                overdue_numbers.append({'number': num, 'drawsAgo': random.randint(20, 60)})
-                used_numbers.add(num)
-        overdue_numbers.sort(key=lambda x: x['drawsAgo'], reverse=True)
-
-        cache_data = load_cache()
-        cache_info = {
-            'source': cache_data.get('source', 'unknown') if cache_data else 'unknown',
-            'lastScraping': cache_data.get('last_scraping') if cache_data else None,
-            'cacheTimestamp': cache_data.get('timestamp') if cache_data else None
-        }
+def store_analysis(**fields):
+    with _analysis_lock:
+        _analysis_cache.update(fields, timestamp=datetime.now())
+        # Versões recentes (por ETag) para responder a /api/analysis?since=
+        _analysis_history[fields['etag']] = fields['bodies']['identity']
+        _analysis_history.move_to_end(fields['etag'])
+        while len(_analysis_history) > ANALYSIS_HISTORY_LIMIT:
+            _analysis_history.popitem(last=False)
 
-        last_draw_numbers = []
-        last_draw_stars = []
-        if historical_data and len(historical_data) > 0:
-            try:
-                last_draw_numbers, last_draw_stars = parse_draw_line(historical_data[-1])
-            except ValueError:
-                pass
+def get_draw_index(draws):
+    """Índice de prefixos do histórico, reconstruído apenas quando os dados mudam"""
+    meta = load_draw_meta(DRAWS_FILE) or {}
+    version = (len(draws), meta.get('timestamp'))
+    if _draw_index_cache['version'] != version:
+        _draw_index_cache['index'] = build_draw_index(draws)
+        _draw_index_cache['version'] = version
+    return _draw_index_cache['index']
 
-        response_data = {
-            'totalDraws': len(historical_data),
-            'lastDrawDate': datetime.now().strftime('%Y-%m-%d'),
-            'lastUpdate': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'lastDrawNumbers': last_draw_numbers,
-            'lastDrawStars': last_draw_stars,
-            'cacheInfo': cache_info,
-            'strategicKeys': strategic_keys,
-            'topNumbers': top_numbers,
-            'overdueNumbers': overdue_numbers,
-            'numberFrequencies': number_frequencies,
-            'starFrequencies': star_frequencies
+@instrumented('get_search_keys')
+def get_search_keys(draws, state):
+    """Chaves da pesquisa exaustiva, recalculadas apenas quando os dados mudam"""
+    meta = load_draw_meta(DRAWS_FILE) or {}
+    version = (len(draws), meta.get('timestamp'))
+    if _search_keys_cache['version'] != version:
+        _search_keys_cache['keys'] = generate_search_keys(state)
+        _search_keys_cache['version'] = version
+    return _search_keys_cache['keys']
+
+def get_cooccurrence_state():
+    """(total de sorteios, co-ocorrência) em memória, recarregados do disco apenas quando os dados mudam"""
+    # Versão lida antes dos dados: uma escrita concorrente invalida a entrada no pedido seguinte
+    version = current_data_version()
+    entry = _cooccurrence_cache['entry']
+    if entry is not None and version is not None and _cooccurrence_cache['version'] == version:
+        return entry
+    historical_data = get_historical_data(force_refresh=False)
+    entry = (len(historical_data), get_analysis_state(historical_data)['cooccurrence'])
+    if version is not None:
+        _cooccurrence_cache['entry'] = entry
+        _cooccurrence_cache['version'] = version
+    return entry
+
+@instrumented('get_top_keys')
+def get_cached_top_keys(draws, profile, limit):
+    """Melhores chaves de um perfil, calculadas uma vez por (versão dos dados, perfil, limite)"""
+    meta = load_draw_meta(DRAWS_FILE) or {}
+    version = (len(draws), meta.get('timestamp'))
+    keys = _top_keys_cache['keys'].get((version, profile, limit)) if _top_keys_cache['version'] == version else None
+    if keys is not None:
+        return keys
+
+    def compute():
+        scorer = LinearScorer(get_analysis_state(draws), PROFILES[profile])
+        result = top_keys(scorer, limit)
+        if _top_keys_cache['version'] != version:
+            _top_keys_cache.update({'version': version, 'keys': {}})
+        _top_keys_cache['keys'][(version, profile, limit)] = result
+        return result
+
+    # Pedidos simultâneos iguais esperam pela mesma pesquisa
+    return _top_keys_flight.run((version, profile, limit), compute)[0]
+
+def parse_window_bound(value):
+    """Limite de janela: posição do sorteio (inteiro) ou data AAAA-MM-DD"""
+    if value is None or value == '':
+        return None, None
+    if value.lstrip('-').isdigit():
+        return int(value), None
+    datetime.strptime(value, '%Y-%m-%d')
+    return None, parse_draw_date(value)
+
+def build_analysis_response(draws, numbers_stats, stars_stats, total_draws, last_position, window=None, cooccurrence=None,
+                            search_keys=None):
+    """Corpo de /api/analysis a partir das estatísticas (histórico completo ou janela)"""
+    strategic_keys = generate_keys_from_state({'numbers': numbers_stats, 'stars': stars_stats, 'total': total_draws,
+                                               'cooccurrence': cooccurrence}, search_keys)
+
+    if not strategic_keys:
+        strategic_keys = {
+            'principal': {'numbers': [19, 23, 28, 34, 44], 'stars': [2, 11]},
+            'secundaria': {'numbers': [1, 3, 4, 21, 42], 'stars': [1, 3]},
+            'hibrida': {'numbers': [6, 8, 10, 29, 50], 'stars': [4, 10]}
         }
 
-        _analysis_cache['data'] = response_data
-        _analysis_cache['timestamp'] = datetime.now()
+    number_frequencies = numbers_stats['count'].tolist()
+    star_frequencies = stars_stats['count'].tolist()
 
-        return jsonify(response_data)
+    top_numbers = [{'number': i+1, 'frequency': freq} for i, freq in enumerate(number_frequencies)]
+    top_numbers.sort(key=lambda x: x['frequency'], reverse=True)
+    top_numbers = top_numbers[:5]
+
+    overdue_numbers = overdue_ranking(numbers_stats, total_draws)
+
+    cache_data = load_draw_meta(DRAWS_FILE)
+    cache_info = {
+        'source': cache_data.get('source', 'unknown') if cache_data else 'unknown',
+        'lastScraping': cache_data.get('last_scraping') if cache_data else None,
+        'cacheTimestamp': cache_data.get('timestamp') if cache_data else None
+    }
+
+    last_draw_numbers = []
+    last_draw_stars = []
+    last_draw_date = None
+    if total_draws > 0:
+        last_draw_numbers = draws['numbers'][last_position].tolist()
+        last_draw_stars = draws['stars'][last_position].tolist()
+        last_draw_date = format_draw_date(draws['date'][last_position])
+
+    response_data = {
+        'totalDraws': total_draws,
+        'lastDrawDate': last_draw_date or datetime.now().strftime('%Y-%m-%d'),
+        'lastUpdate': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'lastDrawNumbers': last_draw_numbers,
+        'lastDrawStars': last_draw_stars,
+        'cacheInfo': cache_info,
+        'strategicKeys': strategic_keys,
+        # Motor das chaves principal/secundaria/hibrida: as janelas não têm pares e usam sempre o greedy
+        'keyEngine': 'search' if search_keys else 'greedy',
+        'topNumbers': top_numbers,
+        'overdueNumbers': overdue_numbers,
+        'numberFrequencies': number_frequencies,
+        'starFrequencies': star_frequencies
+    }
+    if window is not None:
+        response_data['window'] = window
+    return response_data
+
+def get_window_analysis(historical_data, from_value, to_value):
+    """Análise de uma janela [from, to] (posições ou datas, inclusivos) via índice de prefixos"""
+    start, start_date = parse_window_bound(from_value)
+    end, end_date = parse_window_bound(to_value)
+    index = get_draw_index(historical_data)
+    lo, hi = resolve_window(index, start, end, start_date, end_date)
+    window = {
+        'from': lo,
+        'to': hi - 1,
+        'fromDate': format_draw_date(historical_data['date'][lo]) if hi > lo else None,
+        'toDate': format_draw_date(historical_data['date'][hi - 1]) if hi > lo else None,
+        'draws': hi - lo,
+    }
+    numbers_stats = window_stats(index['numbers'], lo, hi)
+    stars_stats = window_stats(index['stars'], lo, hi)
+    return build_analysis_response(historical_data, numbers_stats, stars_stats, hi - lo, hi - 1, window)
+
+def compute_analysis():
+    """Análise completa do histórico; guarda o resultado no cache em memória e no ficheiro partilhado"""
+    # A versão lida antes dos sorteios: uma atualização concorrente deixa-a desatualizada, nunca adiantada
+    version = current_data_version()
+    historical_data = get_historical_data(force_refresh=False)
+    if version is None:
+        version = current_data_version()
+    analysis_state = get_analysis_state(historical_data)
+    search_keys = None
+    if KEY_ENGINE == 'search' and len(historical_data):
+        search_keys = get_search_keys(historical_data, analysis_state)
+    response_data = build_analysis_response(
+        historical_data, analysis_state['numbers'], analysis_state['stars'],
+        analysis_state['total'], len(historical_data) - 1, cooccurrence=analysis_state['cooccurrence'],
+        search_keys=search_keys)
+
+    etag, bodies = encode_analysis(response_data)
+    try:
+        shared_analysis.publish(shared_version(version), etag, bodies)
+    except OSError as e:
+        log_error(f"Erro ao gravar analise partilhada: {e}")
+    store_analysis(data=response_data, version=version, etag=etag, bodies=bodies)
+    return response_data
+
+def encode_analysis(response_data):
+    """Serializa a análise uma vez e pré-comprime-a (gzip e, se disponível, brotli); ETag = SHA-256 do JSON"""
+    with timed('json_serialize', endpoint='analysis'):
+        body = app.json.dumps(response_data, separators=(',', ':')).encode('utf-8')
+    with timed('compress', endpoint='analysis'):
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body, quality=11)
+    return hashlib.sha256(body).hexdigest()[:32], bodies
+
+def shared_version(version):
+    """Carimbo do ficheiro partilhado: versão dos dados mais a do formato da resposta (ignora ficheiros de código antigo)"""
+    return None if version is None else [*version, ANALYSIS_SCHEMA]
+
+def adopt_shared_analysis(version):
+    """Usa a análise do ficheiro partilhado se foi calculada (por qualquer worker) para esta versão"""
+    try:
+        entry = shared_analysis.read()
+    except ValueError as e:
+        log_warning(str(e))
+        return False
+    if entry is None or version is None or entry['version'] != shared_version(version):
+        return False
+    store_analysis(data=None, version=version, etag=entry['etag'], bodies=entry['bodies'])
+    return True
+
+def refresh_analysis():
+    """Traz o cache para a versão atual; pedidos concorrentes esperam pela mesma execução (single-flight)"""
+    # Ordem dos bloqueios: update.lock antes do da análise. O histórico simulado inicial (que usa
+    # update.lock) é criado antes do single-flight e do bloqueio da análise, nunca dentro deles
+    get_historical_data(force_refresh=False)
+    entry, coalesced = _analysis_flight.run('analysis', _refresh_analysis)
+    if coalesced:
+        ANALYSIS_CACHE_REQUESTS.inc(result='coalesced')
+    return entry
+
+def _refresh_analysis():
+    version = current_data_version()
+    if _is_cache_valid(analysis_snapshot(), version):
+        ANALYSIS_CACHE_REQUESTS.inc(result='hit')
+        return analysis_snapshot()
+    if adopt_shared_analysis(version):
+        ANALYSIS_CACHE_REQUESTS.inc(result='shared')
+        return analysis_snapshot()
+    # Entre workers, o bloqueio do ficheiro faz com que só um calcule cada versão
+    with shared_analysis.locked():
+        version = current_data_version()
+        if adopt_shared_analysis(version):
+            ANALYSIS_CACHE_REQUESTS.inc(result='shared')
+            return analysis_snapshot()
+        ANALYSIS_CACHE_REQUESTS.inc(result='miss')
+        compute_analysis()
+    return analysis_snapshot()
+
+def start_revalidation():
+    """Recalcula a análise numa thread em segundo plano, no máximo uma de cada vez"""
+    if not _revalidation_lock.acquire(blocking=False):
+        return False
+
+    def revalidate():
+        try:
+            refresh_analysis()
+        except Exception as e:
+            log_error(f"Erro ao revalidar analise: {e}")
+        finally:
+            _revalidation_lock.release()
+
+    threading.Thread(target=revalidate, name='analysis-revalidate', daemon=True).start()
+    return True
+
+def analysis_entry():
+    """Entrada de cache {etag, bodies, ...} a servir em /api/analysis (stale-while-revalidate)"""
+    version = current_data_version()
+    entry = analysis_snapshot()
+    if _is_cache_valid(entry, version):
+        ANALYSIS_CACHE_REQUESTS.inc(result='hit')
+        return entry
+    if entry['bodies'] is None:
+        return refresh_analysis()
+    if adopt_shared_analysis(version):
+        ANALYSIS_CACHE_REQUESTS.inc(result='shared')
+        return analysis_snapshot()
+    # Dados novos ainda sem análise: serve a anterior enquanto uma thread recalcula
+    start_revalidation()
+    ANALYSIS_CACHE_REQUESTS.inc(result='stale')
+    return entry
+
+def negotiate_encoding(bodies):
+    """Melhor codificação pré-comprimida aceite pelo cliente (br, gzip ou identity)"""
+    return next((name for name in ('br', 'gzip') if name in bodies and request.accept_encodings[name]), 'identity')
+
+def analysis_response(entry):
+    """Corpo pré-comprimido negociado por Accept-Encoding, com ETag forte por codificação e 304 condicional"""
+    encoding = negotiate_encoding(entry['bodies'])
+    etag = entry['etag'] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry['bodies'][encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['X-Analysis-Version'] = entry['etag']
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age=0, stale-while-revalidate={ANALYSIS_STALE_SECONDS}'
+    return response
+
+def analysis_delta(since, entry):
+    """Corpo de /api/analysis?since=: campos alterados e sorteios acrescentados desde a versão `since`"""
+    current = entry['data'] if entry['data'] is not None else json.loads(entry['bodies']['identity'])
+    delta = {'version': entry['etag'], 'since': since, 'full': False, 'changes': {}, 'appendedDraws': []}
+    if since == entry['etag']:
+        return delta
+    with _analysis_lock:
+        previous_body = _analysis_history.get(since)
+    previous = json.loads(previous_body) if previous_body is not None else None
+    # Versão desconhecida (ou histórico substituído): a análise completa
+    if previous is None or previous.get('cacheInfo', {}).get('source') != current.get('cacheInfo', {}).get('source'):
+        delta.update({'full': True, 'changes': None, 'analysis': current})
+        return delta
+    delta['changes'] = analysis_diff(previous, current)
+    # Quase tudo mudou: a diferença não poupa bytes em relação à análise completa
+    if len(json.dumps(delta['changes'], separators=(',', ':'))) >= len(entry['bodies']['identity']):
+        delta.update({'full': True, 'changes': None, 'analysis': current})
+        return delta
+    old_total, new_total = previous['totalDraws'], current['totalDraws']
+    if new_total > old_total:
+        draws = load_draws()
+        if draws is not None:
+            appended = draws[max(old_total, new_total - NEW_DRAWS_EVENT_LIMIT):new_total]
+            delta['appendedDraws'] = [draw_event(draw) for draw in appended]
+            delta['appendedCount'] = new_total - old_total
+    return delta
+
+def analysis_delta_response(since, entry):
+    """Resposta de ?since=, serializada uma vez por par (versão do cliente, versão atual)"""
+    with _analysis_lock:
+        if _analysis_deltas['etag'] != entry['etag']:
+            _analysis_deltas.update({'etag': entry['etag'], 'bodies': {}})
+        bodies = _analysis_deltas['bodies'].get(since)
+    if bodies is None:
+        with timed('json_serialize', endpoint='analysis_delta'):
+            body = app.json.dumps(analysis_delta(since, entry), separators=(',', ':')).encode('utf-8')
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        with _analysis_lock:
+            # Só guarda se o cache ainda for o desta versão (outra thread pode tê-lo trocado entretanto)
+            if _analysis_deltas['etag'] == entry['etag'] and (since in _analysis_history or since == entry['etag']):
+                _analysis_deltas['bodies'][since] = bodies
+    encoding = 'gzip' if negotiate_encoding(bodies) == 'gzip' and len(bodies['gzip']) < len(bodies['identity']) else 'identity'
+    response = Response(bodies[encoding], mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['X-Analysis-Version'] = entry['etag']
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def current_analysis(entry=None):
+    """Análise de uma entrada do cache (por omissão, a última deste processo) como dicionário (None se não houver)"""
+    entry = analysis_snapshot() if entry is None else entry
+    if entry['data'] is not None or entry['bodies'] is None:
+        return entry['data']
+    data = json.loads(entry['bodies']['identity'])
+    with _analysis_lock:
+        if _analysis_cache['etag'] == entry['etag']:
+            _analysis_cache['data'] = data
+    return data
+
+def warm_analysis():
+    """Pré-calcula a resposta de /api/analysis logo após o arranque"""
+    started = time.perf_counter()
+    try:
+        analysis_entry()
+    except Exception as e:
+        log_error(f"Erro no pre-calculo da analise: {e}")
+        return
+    _startup['warmSeconds'] = time.perf_counter() - started
+    OPERATION_SECONDS.observe(_startup['warmSeconds'], operation='startup_warm_analysis')
+    log_cache(f"Analise pre-calculada em {_startup['warmSeconds'] * 1000:.0f} ms")
+
+def start_warmup():
+    thread = threading.Thread(target=warm_analysis, name='analysis-warmup', daemon=True)
+    thread.start()
+    return thread
+
+@app.route('/api/analysis')
+def get_analysis():
+    """API endpoint para obter dados de análise - uma vez por versão dos dados (?from=&to= janelas, ?since= diferenças)"""
+    from_value, to_value = request.args.get('from'), request.args.get('to')
+    windowed = bool(from_value or to_value)
+
+    try:
+        if windowed:
+            historical_data = get_historical_data(force_refresh=False)
+            try:
+                response_data = get_window_analysis(historical_data, from_value, to_value)
+                with timed('json_serialize', endpoint='analysis'):
+                    return jsonify(response_data)
+            except ValueError as e:
+                return jsonify({'error': f'Janela invalida: {e}'}), 400
+
+        since = request.args.get('since')
+        if since:
+            return analysis_delta_response(since, analysis_entry())
+        return analysis_response(analysis_entry())
 
     except Exception as e:
         log_error(f"Erro na API: {e}")
@@ -271,34 +851,224 @@ def get_analysis():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/update')
-def update_data():
-    """API endpoint para atualizar os dados - faz scraping real"""
-    global _analysis_cache
+@app.route('/api/cooccurrence')
+def get_cooccurrence():
+    """API endpoint com pares/trios mais frequentes (?number=&star= para os companheiros de um valor, ?limit=)"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        # int() direto: com type=int um valor inválido seria ignorado em silêncio
+        number = int(request.args['number']) if 'number' in request.args else None
+        star = int(request.args['star']) if 'star' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'Parametros invalidos'}), 400
+    if (number is not None and not 1 <= number <= 50) or (star is not None and not 1 <= star <= 12):
+        return jsonify({'error': 'Numero ou estrela fora do intervalo'}), 400
 
     try:
-        log_info("Pedido de atualização recebido - iniciando scraping...")
-        _analysis_cache['data'] = None
-        _analysis_cache['timestamp'] = None
-
-        historical_data = get_historical_data(force_refresh=True)
-
-        if historical_data and len(historical_data) > 0:
-            return jsonify({
-                'status': 'success',
-                'message': f'Dados atualizados com sucesso! {len(historical_data)} sorteios processados',
-                'totalDraws': len(historical_data),
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return jsonify({'status': 'error', 'message': 'Falha ao obter dados'}), 500
+        total_draws, cooccurrence = get_cooccurrence_state()
+        response_data = {
+            'totalDraws': total_draws,
+            'numberPairs': top_pairs(cooccurrence['numberPairs'], limit),
+            'starPairs': top_pairs(cooccurrence['starPairs'], limit),
+            'numberTriples': top_triples(cooccurrence['numberTriples'], limit),
+        }
+        if number is not None:
+            response_data['numberCompanions'] = companions(cooccurrence['numberPairs'], number, limit)
+        if star is not None:
+            response_data['starCompanions'] = companions(cooccurrence['starPairs'], star, limit)
+        return jsonify(response_data)
+    except Exception as e:
+        log_error(f"Erro na API: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/keys/top')
+def get_top_keys():
+    """API endpoint com as melhores chaves completas de um perfil (?profile=&limit=)"""
+    profile = request.args.get('profile', 'principal')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    if profile not in PROFILES:
+        return jsonify({'error': f"Perfil desconhecido: {profile}"}), 400
+    try:
+        historical_data = get_historical_data(force_refresh=False)
+        keys = get_cached_top_keys(historical_data, profile, limit)
+        return jsonify({'profile': profile, 'weights': PROFILES[profile], 'keys': keys})
+    except Exception as e:
+        log_error(f"Erro na API: {e}")
+        return jsonify({'error': str(e)}), 500
 
+@app.route('/api/backtest')
+def get_backtest():
+    """API endpoint com o backtest das estratégias (?start=&end=&workers=), em cache por versão dos dados e janela"""
+    try:
+        start = request.args.get('start', 50, type=int)
+        end = request.args.get('end', type=int)
+        workers = request.args.get('workers', type=int)
+        historical_data = get_historical_data(force_refresh=False)
+        meta = load_draw_meta(DRAWS_FILE) or {}
+        start = max(1, start)
+        end = len(historical_data) if end is None else min(end, len(historical_data))
+        cache_key = (len(historical_data), meta.get('timestamp'), start, end)
+        # Um backtest de cada vez: ocupa todos os CPUs (workers limitado a os.cpu_count())
+        with _backtest_lock:
+            if cache_key not in _backtest_cache:
+                for key in [key for key in _backtest_cache if key[:2] != cache_key[:2]]:
+                    del _backtest_cache[key]
+                _backtest_cache[cache_key] = run_backtest(historical_data, start, end, workers)
+                log_info(f"Backtest: {_backtest_cache[cache_key]['draws']} sorteios em {_backtest_cache[cache_key]['elapsedSeconds']}s")
+                while len(_backtest_cache) > BACKTEST_CACHE_LIMIT:
+                    _backtest_cache.popitem(last=False)
+            _backtest_cache.move_to_end(cache_key)
+            return jsonify(_backtest_cache[cache_key])
+    except Exception as e:
+        log_error(f"Erro na API: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def analysis_diff(previous, current):
+    """Campos de /api/analysis que mudaram; frequências como {índice: valor} só para as posições alteradas"""
+    if previous is None:
+        return {'full': True}
+    diff = {}
+    for field, value in current.items():
+        if field in ('numberFrequencies', 'starFrequencies'):
+            old = previous.get(field) or []
+            changed = {i: v for i, v in enumerate(value) if i >= len(old) or old[i] != v}
+            if changed or len(old) != len(value):
+                diff[field] = changed
+        elif field == 'strategicKeys':
+            old = previous.get(field) or {}
+            changed = {name: key for name, key in value.items() if old.get(name) != key}
+            if changed:
+                diff[field] = changed
+        elif previous.get(field) != value:
+            diff[field] = value
+    return diff
+
+def draw_event(draw):
+    return {
+        'date': format_draw_date(draw['date']),
+        'numbers': draw['numbers'].tolist(),
+        'stars': draw['stars'].tolist(),
+    }
+
+@instrumented('update_job')
+def run_update(job):
+    """Corre num worker em segundo plano: scraping real, gravação e atualização do estado de análise"""
+    log_info(f"Job de atualização {job.id} iniciado - iniciando scraping...")
+    # Com vários workers, só um processo escreve o histórico de cada vez
+    with file_lock(UPDATE_LOCK_FILE):
+        return _run_update(job)
+
+def _run_update(job):
+    previous_draws = load_draws()
+    previous_total = 0 if previous_draws is None else len(previous_draws)
+    historical_data = get_historical_data(force_refresh=True, progress=job)
+    if historical_data is None or len(historical_data) == 0:
+        raise RuntimeError('Falha ao obter dados')
+
+    if previous_draws is not None and is_extension_of(previous_draws, historical_data):
+        new_draws = historical_data[previous_total:]
+    else:
+        new_draws = historical_data
+    job.publish('draws', {
+        'count': len(new_draws),
+        'total': len(historical_data),
+        'draws': [draw_event(draw) for draw in new_draws[-NEW_DRAWS_EVENT_LIMIT:]],
+    })
+
+    # O diff parte da análise que este processo tinha (baseVersion): o cliente só o aplica sobre essa versão
+    previous = analysis_snapshot()
+    previous_analysis = current_analysis(previous)
+    entry = refresh_analysis()
+    job.publish('analysis', {**analysis_diff(previous_analysis, current_analysis(entry)),
+                             'baseVersion': previous['etag'], 'version': entry['etag']})
+    job.message = f'Dados atualizados com sucesso! {len(historical_data)} sorteios processados'
+    return {'totalDraws': len(historical_data), 'newDraws': len(new_draws), 'timestamp': datetime.now().isoformat()}
+
+update_jobs = JobManager(run_update, status_dir=JOBS_DIR)
+
+@app.route('/api/update', methods=['GET', 'POST'])
+def update_data():
+    """API endpoint para atualizar os dados - inicia (ou junta-se a) um job de scraping em segundo plano"""
+    try:
+        job, created = update_jobs.submit()
+        if created:
+            log_info(f"Pedido de atualização recebido - job {job['id']}")
+        return jsonify({
+            'status': 'accepted' if created else 'running',
+            'jobId': job['id'],
+            'job': job
+        }), 202
     except Exception as e:
         log_error(f"Erro ao atualizar dados: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/update/<job_id>')
+def update_status(job_id):
+    """API endpoint com o progresso de um job de atualização (de qualquer worker)"""
+    snapshot = update_jobs.snapshot(job_id)
+    if snapshot is None:
+        return jsonify({'status': 'error', 'message': 'Job desconhecido'}), 404
+    return jsonify(snapshot)
+
+@app.route('/api/update/<job_id>/events')
+def update_events(job_id):
+    """API endpoint text/event-stream com o progresso por ano, os sorteios novos e o diff da análise"""
+    job = update_jobs.get(job_id)
+    if job is None and update_jobs.snapshot(job_id) is None:
+        return jsonify({'status': 'error', 'message': 'Job desconhecido'}), 404
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+    except ValueError:
+        last_id = 0
+
+    def stream():
+        sent = last_id
+        yield 'retry: 2000\n\n'
+        while True:
+            events = job.events_after(sent, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                if not job.running:
+                    return
+                yield ': keepalive\n\n'
+                continue
+            for event_id, event, data in events:
+                sent = event_id
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                if event == 'done':
+                    return
+
+    def stream_snapshots():
+        # Job de outro worker: progresso e fim lidos do ficheiro de estado, sem diff da análise
+        sent, years_done, idle = last_id, None, 0
+        yield 'retry: 2000\n\n'
+        while True:
+            snapshot = update_jobs.snapshot(job_id)
+            if snapshot is None:
+                return
+            if snapshot['status'] not in ('pending', 'running'):
+                sent += 1
+                yield f"id: {sent}\nevent: done\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+                return
+            if snapshot['yearsDone'] != years_done:
+                years_done, idle, sent = snapshot['yearsDone'], 0, sent + 1
+                progress = {'yearsDone': years_done, 'yearsTotal': snapshot['yearsTotal']}
+                yield f"id: {sent}\nevent: year\ndata: {json.dumps(progress)}\n\n"
+            elif idle >= SSE_KEEPALIVE_SECONDS:
+                idle = 0
+                yield ': keepalive\n\n'
+            time.sleep(SSE_POLL_SECONDS)
+            idle += SSE_POLL_SECONDS
+
+    return Response(stream() if job is not None else stream_snapshots(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/metrics')
+def get_metrics():
+    """API endpoint com as métricas do processo em formato de texto Prometheus"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     import logging
     import os
@@ -310,6 +1080,10 @@ if __name__ == '__main__':
     cli = sys.modules['flask.cli']
     cli.show_server_banner = lambda *x: None
 
+    log_info(f"Imports do servidor: {IMPORT_SECONDS * 1000:.0f} ms")
+    if WARM_START:
+        start_warmup()
+
     log_success("Servidor iniciado em http://127.0.0.1:5001")
     log_info("Pressione CTRL+C para sair")
 
@@ -0,0 +1,112 @@
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Métricas em memória do processo, expostas em formato de texto Prometheus em /api/metrics.
+# Os histogramas usam buckets cumulativos fixos; as etiquetas distinguem séries da mesma métrica.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_labels(key, le=_format_value(bound))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(key)} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(key)} {series['count']}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {_format_value(value)}")
+        return lines
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    with _registry_lock:
+        return _registry.setdefault(name, Histogram(name, help_text, buckets))
+
+def counter(name, help_text):
+    with _registry_lock:
+        return _registry.setdefault(name, Counter(name, help_text))
+
+OPERATION_SECONDS = histogram('euromilhoes_operation_seconds', 'Duracao das operacoes instrumentadas')
+
+@contextmanager
+def timed(operation, metric=OPERATION_SECONDS, **labels):
+    """Regista a duração do bloco no histograma, com a operação como etiqueta"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric.observe(time.perf_counter() - started, operation=operation, **labels)
+
+def instrumented(operation):
+    """Decorador equivalente a `with timed(operation)`"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render_metrics():
+    """Todas as métricas registadas em formato de texto Prometheus 0.0.4"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in sorted(metrics, key=lambda m: m.name):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
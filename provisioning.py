@@ -0,0 +1,237 @@
+"""Instalação do chrome-headless-shell e do chromedriver correspondente em chrome/
+
+    python provisioning.py                                  # última versão estável (rede)
+    python provisioning.py --browser-archive shell.zip --driver-archive driver.zip --version 131.0.6778.85
+    python provisioning.py --verify
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import hashlib
+import zipfile
+import argparse
+from datetime import datetime
+from storage import write_json_atomic
+from utils import log_info, log_success, log_warning, log_error
+
+CHROME_DIR = os.path.join(os.getcwd(), 'chrome')
+MANIFEST_NAME = 'manifest.json'
+PLATFORM = 'linux64'
+VERSIONS_URL = 'https://googlechromelabs.github.io/chrome-for-testing/last-known-good-versions-with-downloads.json'
+COMPONENTS = {
+    'browser': ('chrome-headless-shell', 'chrome-headless-shell'),
+    'driver': ('chromedriver', 'chromedriver'),
+}
+DOWNLOAD_CHUNK = 1 << 20
+
+def manifest_path(chrome_dir=CHROME_DIR):
+    return os.path.join(chrome_dir, MANIFEST_NAME)
+
+def load_manifest(chrome_dir=CHROME_DIR):
+    """Manifesto local {version, platform, browser: {...}, driver: {...}} (None se não existir)"""
+    path = manifest_path(chrome_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log_warning(f"Manifesto do Chrome ilegivel: {e}")
+        return None
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download(url, destination, expected_sha256=None, timeout=60, session=None):
+    """Descarrega em streaming para destination.part, retomando com Range, e devolve o SHA-256
+
+    Em memória fica apenas um bloco de DOWNLOAD_CHUNK bytes de cada vez.
+    """
+    import requests
+
+    session = session or requests.Session()
+    partial = destination + '.part'
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+        # 416: o ficheiro parcial já tem o tamanho completo
+        if response.status_code != 416:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                log_warning(f"Servidor sem suporte de Range, a descarregar {os.path.basename(destination)} de novo")
+                offset = 0
+            if offset:
+                log_info(f"A retomar {os.path.basename(destination)} a partir de {offset} bytes")
+            expected_size = response.headers.get('Content-Length')
+            expected_size = offset + int(expected_size) if expected_size is not None else None
+            with open(partial, 'ab' if offset else 'wb') as f:
+                for block in response.iter_content(DOWNLOAD_CHUNK):
+                    f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+            if expected_size is not None and os.path.getsize(partial) != expected_size:
+                raise IOError(f"Download incompleto de {url}: {os.path.getsize(partial)} de {expected_size} bytes")
+
+    sha256 = file_sha256(partial)
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        os.remove(partial)
+        raise IOError(f"Checksum invalido para {url}: {sha256}")
+    os.replace(partial, destination)
+    return sha256
+
+def extract_archive(archive_path, target_dir):
+    """Extrai o zip sem a pasta de topo (como o zip oficial chrome-<plataforma>/...) e marca os executáveis"""
+    if os.path.isdir(target_dir):
+        shutil.rmtree(target_dir)
+    os.makedirs(target_dir)
+    with zipfile.ZipFile(archive_path) as zf:
+        names = zf.namelist()
+        prefix = os.path.commonprefix(names)
+        prefix = prefix[:prefix.rfind('/') + 1]
+        for member in zf.infolist():
+            member.filename = member.filename[len(prefix):]
+            if not member.filename:
+                continue
+            extracted = zf.extract(member, target_dir)
+            mode = member.external_attr >> 16
+            if mode & 0o111:
+                os.chmod(extracted, os.stat(extracted).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def resolve_downloads(channel='Stable', platform=PLATFORM, timeout=30):
+    """(versão, {componente: url}) a partir do JSON do Chrome for Testing"""
+    import requests
+
+    response = requests.get(VERSIONS_URL, timeout=timeout)
+    response.raise_for_status()
+    release = response.json()['channels'][channel]
+    urls = {}
+    for component, (download_name, _) in COMPONENTS.items():
+        for entry in release['downloads'].get(download_name, []):
+            if entry['platform'] == platform:
+                urls[component] = entry['url']
+        if component not in urls:
+            raise RuntimeError(f"Sem download de {download_name} para {platform} em {channel}")
+    return release['version'], urls
+
+def install(version, archives, urls=None, chrome_dir=CHROME_DIR, platform=PLATFORM, checksums=None):
+    """Extrai os arquivos (browser/driver) para chrome/<componente>/ e grava o manifesto"""
+    os.makedirs(chrome_dir, exist_ok=True)
+    manifest = {'version': version, 'platform': platform, 'installedAt': datetime.now().isoformat(timespec='seconds')}
+    for component, archive in archives.items():
+        sha256 = (checksums or {}).get(component) or file_sha256(archive)
+        target_dir = os.path.join(chrome_dir, component)
+        extract_archive(archive, target_dir)
+        executable = os.path.join(target_dir, COMPONENTS[component][1])
+        if not os.path.exists(executable):
+            raise FileNotFoundError(f"{COMPONENTS[component][1]} nao encontrado em {archive}")
+        manifest[component] = {
+            'path': os.path.relpath(executable, chrome_dir),
+            'archive': os.path.basename(archive),
+            'sha256': sha256,
+            'size': os.path.getsize(archive),
+            'url': (urls or {}).get(component),
+        }
+    write_json_atomic(manifest_path(chrome_dir), manifest, indent=2)
+    return manifest
+
+def provision(channel='Stable', chrome_dir=CHROME_DIR, platform=PLATFORM):
+    """Descarrega (com retoma) a versão atual do canal, se ainda não estiver instalada"""
+    version, urls = resolve_downloads(channel, platform)
+    manifest = load_manifest(chrome_dir)
+    if manifest and manifest.get('version') == version and installed_binaries(chrome_dir):
+        log_info(f"Chrome {version} ja instalado")
+        return manifest
+
+    downloads_dir = os.path.join(chrome_dir, 'downloads')
+    os.makedirs(downloads_dir, exist_ok=True)
+    archives, checksums = {}, {}
+    for component, url in urls.items():
+        archive = os.path.join(downloads_dir, f"{version}-{os.path.basename(url)}")
+        if not os.path.exists(archive):
+            log_info(f"A descarregar {os.path.basename(url)} ({version})")
+            checksums[component] = download(url, archive)
+        archives[component] = archive
+    manifest = install(version, archives, urls, chrome_dir, platform, checksums)
+    log_success(f"Chrome {version} instalado em {chrome_dir}")
+    return manifest
+
+def installed_binaries(chrome_dir=CHROME_DIR):
+    """(chrome, chromedriver) do manifesto local, sem acesso à rede (None se faltar algum)"""
+    manifest = load_manifest(chrome_dir)
+    if not manifest:
+        return None
+    paths = []
+    for component in COMPONENTS:
+        entry = manifest.get(component)
+        path = os.path.join(chrome_dir, entry['path']) if entry else None
+        if not path or not os.path.isfile(path):
+            return None
+        if not os.access(path, os.X_OK):
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        paths.append(path)
+    return tuple(paths)
+
+def installed_driver(chrome_dir=CHROME_DIR):
+    binaries = installed_binaries(chrome_dir)
+    return binaries[1] if binaries else None
+
+def verify(chrome_dir=CHROME_DIR):
+    """Confere os arquivos guardados em chrome/downloads com os checksums do manifesto"""
+    manifest = load_manifest(chrome_dir)
+    if not manifest:
+        return False
+    ok = installed_binaries(chrome_dir) is not None
+    for component in COMPONENTS:
+        entry = manifest.get(component) or {}
+        archive = os.path.join(chrome_dir, 'downloads', entry.get('archive') or '')
+        if os.path.isfile(archive) and file_sha256(archive) != entry.get('sha256'):
+            log_error(f"Checksum diferente do manifesto: {archive}")
+            ok = False
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channel', default='Stable')
+    parser.add_argument('--chrome-dir', default=CHROME_DIR)
+    parser.add_argument('--browser-archive', help='Zip local do chrome-headless-shell (instalação sem rede)')
+    parser.add_argument('--driver-archive', help='Zip local do chromedriver correspondente')
+    parser.add_argument('--version', help='Versão dos arquivos locais')
+    parser.add_argument('--browser-sha256', help='SHA-256 esperado do zip do browser')
+    parser.add_argument('--driver-sha256', help='SHA-256 esperado do zip do driver')
+    parser.add_argument('--verify', action='store_true', help='Só verifica a instalação existente')
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.chrome_dir)
+        (log_success if ok else log_error)(f"Instalacao {'valida' if ok else 'invalida'} em {args.chrome_dir}")
+        return 0 if ok else 1
+
+    if args.browser_archive or args.driver_archive:
+        if not (args.browser_archive and args.driver_archive and args.version):
+            parser.error('--browser-archive, --driver-archive e --version sao usados em conjunto')
+        archives = {'browser': args.browser_archive, 'driver': args.driver_archive}
+        expected = {'browser': args.browser_sha256, 'driver': args.driver_sha256}
+        for component, archive in archives.items():
+            if expected[component] and file_sha256(archive) != expected[component].lower():
+                log_error(f"Checksum invalido: {archive}")
+                return 1
+        downloads_dir = os.path.join(args.chrome_dir, 'downloads')
+        os.makedirs(downloads_dir, exist_ok=True)
+        for component, archive in archives.items():
+            archives[component] = os.path.join(downloads_dir, f"{args.version}-{os.path.basename(archive)}")
+            shutil.copyfile(archive, archives[component])
+        manifest = install(args.version, archives, chrome_dir=args.chrome_dir)
+        log_success(f"Chrome {manifest['version']} instalado a partir de arquivos locais")
+        return 0
+
+    provision(args.channel, args.chrome_dir)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
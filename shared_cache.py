@@ -0,0 +1,99 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem bloqueio entre processos (modo de um só worker)
+    fcntl = None
+
+# Resposta de /api/analysis partilhada entre os workers do servidor WSGI. Cada ficheiro tem um
+# cabeçalho fixo (magic, tamanho do carimbo, tamanho dos corpos), o carimbo em JSON (versão dos
+# dados, ETag, tamanho de cada codificação) e os corpos já serializados e comprimidos. É escrito
+# com rename atómico, por isso um worker só precisa de um stat por pedido para saber se há uma
+# versão nova. Cada worker lê uma versão nova uma vez (via mmap) e guarda uma cópia dos corpos
+# em memória; o que se poupa entre processos é o cálculo e a compressão, não a memória.
+
+MAGIC = b'EMA2'
+HEADER = struct.Struct('<4sII')
+
+_held_locks = threading.local()
+
+@contextmanager
+def file_lock(path):
+    """Bloqueio exclusivo entre processos (flock) sobre path, reentrante na mesma thread"""
+    held = _held_locks.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class SharedAnalysis:
+    """Ficheiro mapeado em memória com a última análise calculada: versão, ETag e corpo por codificação"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._identity = None
+        self._entry = None
+
+    def read(self):
+        """{version, etag, bodies: {codificação: bytes}} atual (None se não existir); só remapeia ficheiros novos"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if identity != self._identity:
+            try:
+                self._entry = self._map()
+            except (OSError, ValueError, KeyError) as e:
+                raise ValueError(f"Analise partilhada invalida em {self.path}: {e}")
+            self._identity = identity
+        return self._entry
+
+    def _map(self):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            if len(mapping) < HEADER.size:
+                raise ValueError('ficheiro truncado')
+            magic, stamp_size, body_size = HEADER.unpack_from(mapping)
+            if magic != MAGIC or HEADER.size + stamp_size + body_size != len(mapping):
+                raise ValueError('cabecalho inesperado')
+            offset = HEADER.size + stamp_size
+            stamp = json.loads(mapping[HEADER.size:offset])
+            bodies = {}
+            for encoding, size in stamp['parts']:
+                bodies[encoding] = mapping[offset:offset + size]
+                offset += size
+            return {'version': stamp['version'], 'etag': stamp['etag'], 'bodies': bodies}
+
+    def publish(self, version, etag, bodies):
+        """Grava a entrada com ficheiro temporário + rename; os outros workers veem-na no pedido seguinte"""
+        parts = [[encoding, len(body)] for encoding, body in bodies.items()]
+        stamp = json.dumps({'version': version, 'etag': etag, 'parts': parts}).encode('utf-8')
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(stamp), sum(size for _, size in parts)))
+            f.write(stamp)
+            for body in bodies.values():
+                f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._identity, self._entry = None, {'version': version, 'etag': etag, 'bodies': dict(bodies)}
+
+    def locked(self):
+        """Só um worker calcula uma versão nova; os outros esperam e leem o resultado"""
+        return file_lock(self.lock_path)
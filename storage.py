@@ -0,0 +1,358 @@
+import os
+import json
+import hashlib
+import uuid
+import threading
+from itertools import islice
+import numpy as np
+from metrics import instrumented
+
+# Registo de largura fixa por sorteio: posição, data (AAAAMMDD; AAAA0000 quando só o ano
+# é conhecido, 0 se desconhecida), 5 números e 2 estrelas em colunas uint8.
+DRAW_DTYPE = np.dtype([
+    ('index', '<u4'),
+    ('date', '<u4'),
+    ('numbers', 'u1', (5,)),
+    ('stars', 'u1', (2,)),
+])
+
+def temp_path_for(path):
+    """Nome temporário por processo e thread, para escritores concorrentes não partilharem o mesmo ficheiro"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def atomic_write(path, write, mode='wb'):
+    """Escreve num ficheiro temporário, faz fsync e substitui o destino com rename atómico"""
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_json_atomic(path, data, indent=None):
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=indent), mode='w')
+
+def empty_draws():
+    return np.zeros(0, dtype=DRAW_DTYPE)
+
+PARSE_CHUNK_LINES = 1 << 16
+_REJECT_REASONS = {1: 'formato', 2: 'contagem', 3: 'intervalo', 4: 'repetido'}
+
+def _line_structure(text, total):
+    """Código por linha (0 ok, 1 formato, 2 contagem) a partir dos bytes do bloco, sem regex por linha"""
+    raw = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    newline = raw == 10
+    line_of = np.cumsum(newline) - newline
+    digit = (raw >= 48) & (raw <= 57)
+    plus = raw == 43
+    other = ~(digit | plus | newline | (raw == 32) | (raw == 9) | (raw == 13))
+
+    starts = digit.copy()
+    starts[1:] &= ~digit[:-1]
+    start_pos = np.flatnonzero(starts)
+    start_line = line_of[start_pos]
+    plus_pos = np.flatnonzero(plus)
+    plus_line = line_of[plus_pos]
+    line_plus = np.full(total, -1, dtype=np.int64)
+    line_plus[plus_line] = plus_pos
+
+    runs = np.bincount(start_line, minlength=total)
+    before_plus = np.bincount(start_line[start_pos < line_plus[start_line]], minlength=total)
+    format_ok = (np.bincount(line_of[other], minlength=total) == 0) & (np.bincount(plus_line, minlength=total) == 1)
+    count_ok = (runs == 7) & (before_plus == 5)
+    return np.where(format_ok, np.where(count_ok, 0, 2), 1)
+
+def _parse_chunk(lines):
+    """(valores (n, 7) das linhas aceites, códigos por linha)"""
+    text = '\n'.join(lines)
+    if text.count('\n') != len(lines) - 1:
+        # Quebras de linha dentro de uma entrada: normaliza antes da análise por bytes
+        lines = [line.replace('\n', ' ').replace('\r', ' ') for line in lines]
+        text = '\n'.join(lines)
+    codes = _line_structure(text, len(lines))
+    accepted = codes == 0
+    if not accepted.all():
+        text = '\n'.join(line for line, ok in zip(lines, accepted.tolist()) if ok)
+    values = np.zeros((0, 7), dtype=np.int64)
+    if accepted.any():
+        values = np.fromstring(text.replace('+', ' '), dtype=np.int64, sep=' ').reshape(-1, 7)
+
+    numbers, stars = values[:, :5], values[:, 5:]
+    out_of_range = ((numbers < 1) | (numbers > 50)).any(axis=1) | ((stars < 1) | (stars > 12)).any(axis=1)
+    repeated = (np.diff(np.sort(numbers, axis=1), axis=1) == 0).any(axis=1) | (stars[:, 0] == stars[:, 1])
+    codes[accepted] = np.where(out_of_range, 3, np.where(repeated, 4, 0))
+    return values[~out_of_range & ~repeated], codes
+
+@instrumented('parse_draw_lines')
+def parse_draws(lines, dates=None):
+    """Converte linhas "n n n n n + s s" (sequência ou stream) num array de registos, por blocos
+
+    Valida intervalos (1-50, 1-12), contagens e repetidos; devolve (draws, relatório) com as
+    linhas rejeitadas e as suas posições. As datas, se dadas, acompanham as linhas aceites.
+    """
+    iterator = iter(lines)
+    blocks, accepted_dates, rejected = [], [], []
+    position = 0
+    while True:
+        chunk = [line if isinstance(line, str) else str(line) for line in islice(iterator, PARSE_CHUNK_LINES)]
+        if not chunk:
+            break
+        values, codes = _parse_chunk(chunk)
+        blocks.append(values)
+        for offset in np.flatnonzero(codes).tolist():
+            rejected.append({'position': position + offset, 'line': chunk[offset],
+                             'reason': _REJECT_REASONS[int(codes[offset])]})
+        if dates is not None:
+            accepted_dates.append(np.asarray(dates[position:position + len(chunk)])[codes == 0])
+        position += len(chunk)
+
+    values = np.concatenate(blocks) if blocks else np.zeros((0, 7), dtype=np.int64)
+    draws = np.zeros(len(values), dtype=DRAW_DTYPE)
+    draws['index'] = np.arange(len(values), dtype=np.uint32)
+    draws['numbers'] = values[:, :5]
+    draws['stars'] = values[:, 5:]
+    if dates is not None and len(values):
+        draws['date'] = np.concatenate(accepted_dates)
+    return draws, {'total': position, 'accepted': len(draws), 'rejected': rejected}
+
+def draws_from_lines(lines, dates=None):
+    """Converte linhas "n n n n n + s s" num array de registos (ValueError na primeira linha inválida)"""
+    draws, report = parse_draws(lines, dates)
+    if report['rejected']:
+        first = report['rejected'][0]
+        raise ValueError(f"Linha {first['position']} invalida ({first['reason']}): {first['line']}")
+    return draws
+
+def draws_to_lines(draws):
+    """Converte o array de registos de volta para o formato de texto do cache.json"""
+    return [
+        f"{' '.join(map(str, numbers))} + {' '.join(map(str, stars))}"
+        for numbers, stars in zip(draws['numbers'].tolist(), draws['stars'].tolist())
+    ]
+
+def as_draws(data):
+    """Aceita um array de registos ou uma lista de linhas e devolve sempre o array"""
+    if isinstance(data, np.ndarray) and data.dtype == DRAW_DTYPE:
+        return data
+    return draws_from_lines(list(data or []))
+
+def format_draw_date(value):
+    """AAAAMMDD -> 'AAAA-MM-DD' ('AAAA' se só o ano é conhecido, None se desconhecida)"""
+    value = int(value)
+    if not value:
+        return None
+    if value % 10000 == 0:
+        return f"{value // 10000:04d}"
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+def parse_draw_date(text):
+    if not text:
+        return 0
+    parts = [int(part) for part in str(text).split('-')]
+    if len(parts) == 1:
+        return parts[0] * 10000
+    year, month, day = parts
+    return year * 10000 + month * 100 + day
+
+def has_full_dates(draws):
+    return bool(len(draws)) and bool(np.all(np.asarray(draws['date']) % 10000 != 0))
+
+def chronological(draws):
+    """Ordena por data (estável) e remove sorteios com a mesma data completa"""
+    draws = np.asarray(draws)[np.argsort(draws['date'], kind='stable')]
+    dates = draws['date']
+    repeated = np.zeros(len(draws), dtype=bool)
+    repeated[1:] = (dates[1:] == dates[:-1]) & (dates[1:] % 10000 != 0)
+    return reindex(draws[~repeated])
+
+def reindex(draws):
+    draws = np.array(draws, dtype=DRAW_DTYPE)
+    draws['index'] = np.arange(len(draws), dtype=np.uint32)
+    return draws
+
+def draws_by_year(draws):
+    """Agrupa os sorteios por ano (chave 0 para sorteios sem data), mantendo a ordem"""
+    years = np.asarray(draws['date']) // 10000
+    groups = {}
+    for year in np.unique(years).tolist():
+        groups[year] = draws[years == year]
+    return groups
+
+def meta_path(store_path):
+    return os.path.splitext(store_path)[0] + '_meta.json'
+
+def journal_path(store_path):
+    return os.path.splitext(store_path)[0] + '.jsonl'
+
+def new_history_id():
+    """Identificador de um snapshot reescrito; os acrescentos ao journal mantêm o do snapshot"""
+    return uuid.uuid4().hex
+
+def save_draw_meta(store_path, meta, total):
+    meta = dict(meta or {})
+    meta['total'] = int(total)
+    write_json_atomic(meta_path(store_path), meta)
+
+def save_draw_store(draws, store_path, meta=None):
+    """Grava um snapshot completo (substitui o journal) via ficheiro temporário + rename"""
+    draws = np.ascontiguousarray(draws, dtype=DRAW_DTYPE)
+    atomic_write(store_path, lambda f: np.save(f, draws, allow_pickle=False))
+    # O snapshot já contém tudo o que estava no journal
+    atomic_write(journal_path(store_path), lambda f: None)
+    save_draw_meta(store_path, meta, len(draws))
+
+def save_draw_store_chunks(chunks, total, store_path, meta=None):
+    """Grava um snapshot de `total` sorteios a partir de blocos, sem ter o histórico inteiro em memória"""
+    tmp_path = temp_path_for(store_path)
+    store = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=DRAW_DTYPE, shape=(total,))
+    written = 0
+    try:
+        for chunk in chunks:
+            if written + len(chunk) > total:
+                raise ValueError(f"Mais de {total} sorteios nos blocos")
+            store[written:written + len(chunk)] = chunk
+            written += len(chunk)
+        if written != total:
+            raise ValueError(f"Esperados {total} sorteios, recebidos {written}")
+        store.flush()
+    except Exception:
+        store = None
+        os.remove(tmp_path)
+        raise
+    store = None
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, store_path)
+    atomic_write(journal_path(store_path), lambda f: None)
+    save_draw_meta(store_path, meta, total)
+
+def load_draw_store(store_path):
+    """Mapeia em memória o snapshot binário (None se não existir)"""
+    if not os.path.exists(store_path):
+        return None
+    draws = np.load(store_path, mmap_mode='r', allow_pickle=False)
+    if draws.dtype != DRAW_DTYPE:
+        raise ValueError(f"Formato inesperado em {store_path}: {draws.dtype}")
+    return draws
+
+def load_draw_meta(store_path):
+    path = meta_path(store_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def read_journal(store_path):
+    """Sorteios acrescentados desde o último snapshot (uma linha truncada por escrita interrompida é ignorada)"""
+    path = journal_path(store_path)
+    if not os.path.exists(path):
+        return empty_draws()
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    draws = np.zeros(len(entries), dtype=DRAW_DTYPE)
+    for i, entry in enumerate(entries):
+        draws['date'][i] = parse_draw_date(entry.get('date'))
+        draws['numbers'][i] = entry['numbers']
+        draws['stars'][i] = entry['stars']
+    return draws
+
+def load_history(store_path):
+    """Snapshot mapeado em memória + journal por compactar (None se não houver dados)"""
+    snapshot = load_draw_store(store_path)
+    journal = read_journal(store_path)
+    if len(journal) == 0:
+        return snapshot
+    base = snapshot if snapshot is not None else empty_draws()
+    if len(base) and base['date'][-1]:
+        # Entradas já incluídas num snapshot (falha entre o snapshot e o reset do journal)
+        journal = journal[journal['date'] > base['date'][-1]]
+    return reindex(np.concatenate([base, journal]))
+
+def append_draws(store_path, new_draws, meta=None):
+    """Acrescenta sorteios ao journal em O(novos) e devolve o número de entradas por compactar"""
+    new_draws = as_draws(new_draws)
+    entries = ''.join(
+        json.dumps({'date': format_draw_date(date), 'numbers': numbers, 'stars': stars}) + '\n'
+        for date, numbers, stars in zip(new_draws['date'].tolist(), new_draws['numbers'].tolist(), new_draws['stars'].tolist())
+    )
+    with open(journal_path(store_path), 'a', encoding='utf-8') as f:
+        f.write(entries)
+        f.flush()
+        os.fsync(f.fileno())
+    journal_size = len(read_journal(store_path))
+    snapshot = load_draw_store(store_path)
+    save_draw_meta(store_path, meta, (0 if snapshot is None else len(snapshot)) + journal_size)
+    return journal_size
+
+def is_extension_of(existing, draws):
+    """True se draws começa exatamente pelos sorteios existentes (mesma ordem e datas)"""
+    if existing is None or len(existing) > len(draws):
+        return False
+    head = draws[:len(existing)]
+    return (np.array_equal(head['date'], existing['date'])
+            and np.array_equal(head['numbers'], existing['numbers'])
+            and np.array_equal(head['stars'], existing['stars']))
+
+ANALYSIS_STATE_VERSION = 3
+_STATS_FIELDS = ('count', 'lastDraw', 'gapSum', 'gapCount', 'veryRecent')
+_COOCCURRENCE_FIELDS = ('numberPairs', 'starPairs', 'numberTriples')
+
+def save_analysis_state(state, state_path, history_id=None):
+    """Grava o estado incremental da análise (.npz), ligado ao snapshot history_id, via ficheiro temporário + rename"""
+    arrays = {
+        'version': np.array(ANALYSIS_STATE_VERSION),
+        'historyId': np.array(history_id or ''),
+        'total': np.array(state['total']),
+        'recentWindow': np.array(state['recentWindow']),
+        'recentNumbers': state['recentNumbers'],
+        'recentStars': state['recentStars'],
+    }
+    for group in ('numbers', 'stars'):
+        for field in _STATS_FIELDS:
+            arrays[f'{group}_{field}'] = state[group][field]
+    for field in _COOCCURRENCE_FIELDS:
+        arrays[f'cooccurrence_{field}'] = state['cooccurrence'][field]
+    atomic_write(state_path, lambda f: np.savez(f, **arrays))
+
+def load_analysis_state(state_path):
+    """Lê o estado incremental (None se não existir ou for de outra versão)"""
+    if not os.path.exists(state_path):
+        return None
+    with np.load(state_path, allow_pickle=False) as f:
+        if int(f['version']) != ANALYSIS_STATE_VERSION:
+            return None
+        state = {
+            'historyId': str(f['historyId']) or None,
+            'total': int(f['total']),
+            'recentWindow': int(f['recentWindow']),
+            'recentNumbers': f['recentNumbers'],
+            'recentStars': f['recentStars'],
+        }
+        for group in ('numbers', 'stars'):
+            state[group] = {field: f[f'{group}_{field}'] for field in _STATS_FIELDS}
+        state['cooccurrence'] = {field: f[f'cooccurrence_{field}'] for field in _COOCCURRENCE_FIELDS}
+    return state
+
+def year_content_hash(rows):
+    """Hash do conteúdo de um ano a partir das linhas (date, draw line)"""
+    return hashlib.sha256('\n'.join(f"{date} {line}" for date, line in rows).encode('utf-8')).hexdigest()
+
+def load_manifest(manifest_path):
+    """Manifesto de scraping por ano: {ano: {status, draws, hash, fetchedAt, etag, lastModified}}"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return {int(year): entry for year, entry in json.load(f).get('years', {}).items()}
+
+def save_manifest(manifest, manifest_path):
+    write_json_atomic(manifest_path, {'years': {str(year): manifest[year] for year in sorted(manifest)}}, indent=2)
@@ -0,0 +1,91 @@
+"""Históricos sintéticos vetorizados, gravados por blocos diretamente no armazenamento de sorteios
+
+    python synthetic.py --count 10000000 --seed 1 --skew 0.5 --store /tmp/euromilhoes/draws.npy
+"""
+import sys
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+from storage import DRAW_DTYPE, empty_draws, new_history_id, save_draw_store_chunks
+from utils import log_info, log_success
+
+# Os sorteios são amostras sem reposição geradas por blocos em numpy: uniformes por Fisher-Yates
+# parcial; com pesos, ficam os `size` menores de -log(u)/w (amostragem de Efraimidis-Spirakis).
+
+CHUNK_DRAWS = 1 << 18
+
+def value_weights(max_value, skew, rng):
+    """Pesos por valor: None (uniforme) com skew=0, rank^-skew com os ranks baralhados com skew>0"""
+    if not skew:
+        return None
+    ranks = rng.permutation(max_value) + 1
+    return (ranks.astype(np.float64) ** -skew).astype(np.float32)
+
+def sample_sorted(rng, rows, max_value, size, weights=None):
+    """`rows` amostras de `size` valores distintos em 1..max_value, ordenadas em cada linha"""
+    if weights is None:
+        # Fisher-Yates parcial vetorizado: `size` trocas por linha em vez de max_value chaves
+        values = np.tile(np.arange(max_value, dtype=np.uint8), (rows, 1))
+        row = np.arange(rows)
+        for j in range(size):
+            pick = rng.integers(j, max_value, size=rows)
+            current = values[row, j].copy()
+            values[row, j] = values[row, pick]
+            values[row, pick] = current
+        chosen = values[:, :size]
+    else:
+        keys = -np.log1p(-rng.random((rows, max_value), dtype=np.float32)) / weights
+        chosen = np.argpartition(keys, size - 1, axis=1)[:, :size]
+    chosen.sort(axis=1)
+    return (chosen + 1).astype(np.uint8)
+
+def iter_draw_chunks(count, seed=None, skew=0.0, chunk_size=CHUNK_DRAWS):
+    """Blocos de registos DRAW_DTYPE sem data; a mesma seed e chunk_size dão o mesmo histórico"""
+    rng = np.random.default_rng(seed)
+    number_weights = value_weights(50, skew, rng)
+    star_weights = value_weights(12, skew, rng)
+    for start in range(0, count, chunk_size):
+        rows = min(chunk_size, count - start)
+        chunk = np.zeros(rows, dtype=DRAW_DTYPE)
+        chunk['index'] = np.arange(start, start + rows, dtype=np.uint32)
+        chunk['numbers'] = sample_sorted(rng, rows, 50, 5, number_weights)
+        chunk['stars'] = sample_sorted(rng, rows, 12, 2, star_weights)
+        yield chunk
+
+def generate_draws(count, seed=None, skew=0.0):
+    """Histórico sintético completo em memória (para tamanhos pequenos)"""
+    chunks = list(iter_draw_chunks(count, seed, skew))
+    return np.concatenate(chunks) if chunks else empty_draws()
+
+def write_history(store_path, count, seed=None, skew=0.0, chunk_size=CHUNK_DRAWS):
+    """Grava `count` sorteios sintéticos no snapshot store_path, bloco a bloco"""
+    meta = {
+        'timestamp': datetime.now().isoformat(),
+        'source': 'simulated',
+        'last_scraping': None,
+        'year_range': None,
+        'synthetic': {'seed': seed, 'skew': skew},
+        'history_id': new_history_id(),
+    }
+    save_draw_store_chunks(iter_draw_chunks(count, seed, skew, chunk_size), count, store_path, meta)
+    return meta
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--store', required=True, help='Snapshot de destino (ex.: data/draws.npy - substitui o histórico)')
+    parser.add_argument('--count', type=int, default=10_000_000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--skew', type=float, default=0.0, help='Expoente da distribuição por valor (0 = uniforme)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_DRAWS)
+    args = parser.parse_args()
+
+    log_info(f"A gerar {args.count} sorteios sintéticos em {args.store}")
+    started = time.perf_counter()
+    write_history(args.store, args.count, args.seed, args.skew, args.chunk_size)
+    elapsed = time.perf_counter() - started
+    log_success(f"{args.count} sorteios em {elapsed:.1f}s ({args.count / max(elapsed, 1e-9):,.0f}/s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
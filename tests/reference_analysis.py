@@ -0,0 +1,129 @@
+"""Implementação original (listas e dicionários em Python) de analyze_and_generate_keys, usada como referência"""
+from utils import parse_draw_line
+
+def initialize_frequency_data(max_value):
+    data = {}
+    for i in range(1, max_value + 1):
+        data[i] = {'count': 0, 'lastDraw': -1, 'gaps': [], 'veryRecent': 0}
+    return data
+
+def update_frequency_data(data_dict, items, index, total_draws, recent_window=30):
+    for item in items:
+        data_dict[item]['count'] += 1
+        if data_dict[item]['lastDraw'] != -1:
+            data_dict[item]['gaps'].append(index - data_dict[item]['lastDraw'])
+        data_dict[item]['lastDraw'] = index
+        if index >= total_draws - recent_window:
+            data_dict[item]['veryRecent'] += 1
+
+def calculate_numbers_analysis(numbers_data, total_draws, default_gap=10):
+    analysis = []
+    for num, data in numbers_data.items():
+        avg_gap = sum(data['gaps']) / len(data['gaps']) if data['gaps'] else default_gap
+        current_gap = total_draws - 1 - data['lastDraw']
+        analysis.append({
+            'number': num,
+            'freq': data['count'],
+            'overdueRatio': current_gap / avg_gap if avg_gap > 0 else 0,
+            'isCritical': current_gap > avg_gap * 2 if avg_gap > 0 else False,
+            'isHot': data['veryRecent'] >= 2
+        })
+    return analysis
+
+def calculate_stars_analysis(stars_data, total_draws, default_gap=5):
+    analysis = []
+    for star, data in stars_data.items():
+        avg_gap = sum(data['gaps']) / len(data['gaps']) if data['gaps'] else default_gap
+        current_gap = total_draws - 1 - data['lastDraw']
+        analysis.append({
+            'star': star,
+            'overdueRatio': current_gap / avg_gap if avg_gap > 0 else 0,
+            'isOverdue': current_gap > avg_gap * 1.5 if avg_gap > 0 else False,
+            'isHot': data['veryRecent'] >= 2
+        })
+    return analysis
+
+def analyze_and_generate_keys(all_draws_lines):
+    numbers_data = initialize_frequency_data(50)
+    stars_data = initialize_frequency_data(12)
+
+    total_draws = len(all_draws_lines)
+    for index, line in enumerate(all_draws_lines):
+        main_nums, star_nums = parse_draw_line(line)
+        update_frequency_data(numbers_data, main_nums, index, total_draws)
+        update_frequency_data(stars_data, star_nums, index, total_draws)
+
+    numbers_analysis = calculate_numbers_analysis(numbers_data, total_draws)
+    stars_analysis = calculate_stars_analysis(stars_data, total_draws)
+
+    critical_nums = sorted([n for n in numbers_analysis if n['isCritical']], key=lambda x: x['overdueRatio'], reverse=True)
+    hot_nums = sorted([n for n in numbers_analysis if n['isHot']], key=lambda x: x['number'])
+    premium_nums = sorted([n for n in numbers_analysis if n['freq'] > (total_draws / 50 * 1.1)], key=lambda x: x['freq'], reverse=True)
+    overdue_stars = sorted([s for s in stars_analysis if s['isOverdue']], key=lambda x: x['overdueRatio'], reverse=True)
+    hot_stars = sorted([s for s in stars_analysis if s['isHot']], key=lambda x: x['star'])
+
+    used_nums, used_stars, keys = set(), set(), {}
+
+    def generate_key(num_sources, star_sources):
+        key_nums, key_stars = [], []
+        temp_used_nums, temp_used_stars = set(), set()
+
+        for source, count in num_sources:
+            for num_data in source:
+                if len(key_nums) >= count:
+                    break
+                num = num_data['number']
+                if num not in used_nums and num not in temp_used_nums:
+                    key_nums.append(num)
+                    temp_used_nums.add(num)
+
+        for source, count in star_sources:
+            for star_data in source:
+                if len(key_stars) >= count:
+                    break
+                star = star_data['star']
+                if star not in used_stars and star not in temp_used_stars:
+                    key_stars.append(star)
+                    temp_used_stars.add(star)
+
+        all_available_nums = premium_nums + numbers_analysis
+        all_available_stars = hot_stars + stars_analysis
+
+        while len(key_nums) < 5:
+            num = None
+            for n in all_available_nums:
+                if n['number'] not in used_nums and n['number'] not in temp_used_nums:
+                    num = n['number']
+                    break
+            if num is None:
+                for i in range(1, 51):
+                    if i not in used_nums and i not in temp_used_nums:
+                        num = i
+                        break
+            if num is not None:
+                key_nums.append(num)
+                temp_used_nums.add(num)
+
+        while len(key_stars) < 2:
+            star = None
+            for s in all_available_stars:
+                if s['star'] not in used_stars and s['star'] not in temp_used_stars:
+                    star = s['star']
+                    break
+            if star is None:
+                for i in range(1, 13):
+                    if i not in used_stars and i not in temp_used_stars:
+                        star = i
+                        break
+            if star is not None:
+                key_stars.append(star)
+                temp_used_stars.add(star)
+
+        used_nums.update(key_nums)
+        used_stars.update(key_stars)
+        return {'numbers': sorted(key_nums), 'stars': sorted(key_stars)}
+
+    keys['principal'] = generate_key([(critical_nums, 2), (premium_nums, 5)], [(overdue_stars, 2)])
+    keys['secundaria'] = generate_key([(hot_nums, 3), (premium_nums, 5)], [(hot_stars, 2)])
+    keys['hibrida'] = generate_key([(critical_nums, 1), (hot_nums, 3), (premium_nums, 5)], [(overdue_stars, 1), (hot_stars, 2)])
+    return keys
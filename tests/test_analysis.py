@@ -0,0 +1,58 @@
+import pytest
+from logic import analyze_and_generate_keys, build_analysis_state, apply_draws, generate_keys_from_state, frequency_stats
+from draw_index import build_draw_index, window_stats
+from storage import as_draws, draws_to_lines
+from synthetic import generate_draws
+from reference_analysis import analyze_and_generate_keys as reference_keys
+
+SIZES = (1, 2, 29, 30, 31, 60, 250, 1868)
+SEEDS = range(12)
+# Enviesamentos fortes geram números quentes, atrasados e premium em todas as fontes das chaves
+SKEWS = (0.0, 1.5, 4.0)
+
+def history(size, seed, skew):
+    return draws_to_lines(generate_draws(size, seed, skew))
+
+@pytest.mark.parametrize('skew', SKEWS)
+@pytest.mark.parametrize('size', SIZES)
+def test_keys_match_reference(size, skew):
+    for seed in SEEDS:
+        lines = history(size, seed, skew)
+        assert analyze_and_generate_keys(lines) == reference_keys(lines), (size, seed, skew)
+
+def test_keys_match_reference_for_repeated_draws():
+    lines = ['1 2 3 4 5 + 1 2'] * 40 + ['46 47 48 49 50 + 11 12'] * 3
+    assert analyze_and_generate_keys(lines) == reference_keys(lines)
+
+@pytest.mark.parametrize('skew', SKEWS)
+def test_incremental_state_keys_match_reference(skew):
+    lines = history(400, 7, skew)
+    state = build_analysis_state(lines[:150])
+    for start, end in ((150, 151), (151, 180), (180, 400)):
+        state = apply_draws(state, as_draws(lines[start:end]))
+    keys = generate_keys_from_state(state)
+    keys.pop('afinidade')
+    assert keys == reference_keys(lines)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_affinity_key_shares_no_values_with_other_keys(seed):
+    state = build_analysis_state(history(400, seed, 1.5))
+    # Como as chaves da pesquisa exaustiva: uma por perfil, sem valores em comum
+    search_keys = {name: {'numbers': list(range(1 + 5 * i, 6 + 5 * i)), 'stars': [1 + 2 * i, 2 + 2 * i]}
+                   for i, name in enumerate(('principal', 'secundaria', 'hibrida'))}
+    for override in (None, search_keys):
+        keys = generate_keys_from_state(state, override)
+        numbers = [n for key in keys.values() for n in key['numbers']]
+        stars = [s for key in keys.values() for s in key['stars']]
+        assert len(numbers) == len(set(numbers)) and len(stars) == len(set(stars)), keys
+
+@pytest.mark.parametrize('seed', range(6))
+def test_window_stats_match_frequency_stats_of_the_slice(seed):
+    draws = as_draws(history(300, seed, 1.5))
+    index = build_draw_index(draws)
+    for start, end in ((0, 300), (0, 1), (17, 18), (40, 61), (120, 300), (299, 300)):
+        for group, max_value in (('numbers', 50), ('stars', 12)):
+            expected = frequency_stats(draws[group][start:end], max_value)
+            actual = window_stats(index[group], start, end)
+            for name, values in expected.items():
+                assert actual[name].tolist() == values.tolist(), (seed, start, end, group, name)
@@ -0,0 +1,77 @@
+import os
+import pytest
+from bench.fixtures import FixtureServer
+from logic import HttpEuromilhoesParser, ParallelEuromilhoesParser, YearScraper, parse_results_html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Linhas da tabela #resultsTable de results-history-2024.html, pela ordem da página
+EXPECTED_2024 = [
+    (20241231, '3 17 22 36 48 + 5 11'),
+    (20241227, '1 9 28 40 50 + 2 12'),
+    (20241224, '6 14 19 33 45 + 4 8'),
+    (20241220, '11 20 26 31 42 + 1 7'),
+    (20241217, '2 8 25 39 47 + 3 10'),
+    (20241213, '5 12 23 34 49 + 6 9'),
+]
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+def test_parse_results_html_reads_dated_rows():
+    assert parse_results_html(read_fixture('results-history-2024.html')) == EXPECTED_2024
+
+def test_parse_results_html_without_results_table():
+    assert parse_results_html('<html><body><p>Pagina em manutencao</p></body></html>') is None
+
+def test_http_backend_against_local_page():
+    pages = {'/results-history-2024': read_fixture('results-history-2024.html')}
+    with FixtureServer(pages=pages) as server:
+        parser = HttpEuromilhoesParser(base_url=server.url, workers=1, retries=0)
+        try:
+            assert parser.extract_years([2024]) == {2024: EXPECTED_2024}
+            # O ETag da primeira resposta torna o segundo pedido condicional (304 -> None)
+            assert parser.extract_year(2024) is None
+        finally:
+            parser.close()
+
+def test_http_error_fails_the_year_without_selenium_fallback():
+    with FixtureServer(pages={'/results-history-2023': b''}) as server:
+        parser = HttpEuromilhoesParser(base_url=server.url, workers=1, retries=0)
+        parser._selenium_extract_year = lambda year: pytest.fail('Selenium fallback on an HTTP error')
+        try:
+            assert parser.extract_years([2024]) == {}
+            assert '404' in parser.failed_years[2024]
+        finally:
+            parser.close()
+
+class FakeBrowser(YearScraper):
+    """Substitui o EuromilhoesParser de cada worker sem abrir um browser"""
+    retries = 0
+
+    def __init__(self, broken_years=()):
+        self.broken_years = broken_years
+        self.failed_years = {}
+
+    def extract_year(self, year):
+        if year in self.broken_years:
+            raise RuntimeError(f"sem tabela em {year}")
+        return [(year * 10000 + 101, '1 2 3 4 5 + 1 2')]
+
+    def close(self):
+        pass
+
+def test_parallel_backend_records_worker_failures_per_year():
+    parser = ParallelEuromilhoesParser(chrome_binary_path=None, workers=2)
+
+    def broken_browser():
+        raise RuntimeError('chrome nao encontrado')
+    parser._browser = broken_browser
+    assert parser.extract_years([2023, 2024]) == {}
+    assert parser.failed_years == {2023: 'RuntimeError: chrome nao encontrado', 2024: 'RuntimeError: chrome nao encontrado'}
+
+    parser._browser = lambda: FakeBrowser(broken_years=(2023,))
+    assert parser.extract_years([2023, 2024]) == {2024: [(20240101, '1 2 3 4 5 + 1 2')]}
+    assert parser.failed_years == {2023: 'RuntimeError: sem tabela em 2023'}
+    assert parser.extract_year(2024) == [(20240101, '1 2 3 4 5 + 1 2')]
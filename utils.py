@@ -27,8 +27,10 @@ def log_info(message):
 def log_cache(message):
     colored_print(message, '96')
 
+_DRAW_SEPARATOR = re.compile(r'\s*\+\s*')
+
 def parse_draw_line(line):
-    parts = re.split(r'\s*\+\s*', line.strip())
+    parts = _DRAW_SEPARATOR.split(line.strip())
     if len(parts) != 2:
         raise ValueError(f"Invalid draw line format: {line}")
     main_numbers = [int(x) for x in parts[0].split()]
@@ -1,11 +1,11 @@
 let currentData = null;
 
-async function fetchWithTimeout(url, timeout = 10000) {
+async function fetchWithTimeout(url, timeout = 10000, options = {}) {
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), timeout);
 
     try {
-        const response = await fetch(url, { signal: controller.signal });
+        const response = await fetch(url, { ...options, signal: controller.signal });
         clearTimeout(timeoutId);
         return response;
     } catch (error) {
@@ -74,44 +74,165 @@ function updateChartColors(chartInstance) {
     chartInstance.update('none');
 }
 
+function renderDashboard(data) {
+    currentData = data;
+
+    updateStats(data);
+    updateLastResult(data);
+    updateStrategicKeys(data.strategicKeys);
+    updateTopNumbers(data.topNumbers);
+    updateOverdueNumbers(data.overdueNumbers);
+    updateTrends(data);
+    createNumbersChart(data.numberFrequencies);
+    createStarsChart(data.starFrequencies);
+}
+
+const ANALYSIS_STORAGE_KEY = 'euromilhoes.analysis';
+
+function readStoredAnalysis() {
+    try {
+        const stored = JSON.parse(localStorage.getItem(ANALYSIS_STORAGE_KEY));
+        return stored && stored.version && stored.data ? stored : null;
+    } catch {
+        return null;
+    }
+}
+
+function storeAnalysis(version, data) {
+    if (!version || !data) return;
+    try {
+        localStorage.setItem(ANALYSIS_STORAGE_KEY, JSON.stringify({ version, data }));
+    } catch (error) {
+        console.warn('Não foi possível guardar a análise localmente:', error);
+    }
+}
+
 async function loadDashboardData() {
+    // A última análise guardada é mostrada de imediato; o servidor só envia o que mudou desde essa versão
+    const stored = readStoredAnalysis();
+    if (stored && !currentData) {
+        renderDashboard(stored.data);
+    }
+
     try {
-        const response = await fetchWithTimeout('/api/analysis', 10000);
+        const url = stored ? `/api/analysis?since=${encodeURIComponent(stored.version)}` : '/api/analysis';
+        const response = await fetchWithTimeout(url, 10000);
 
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        const data = await response.json();
-        currentData = data;
-
-        updateStats(data);
-        updateLastResult(data);
-        updateStrategicKeys(data.strategicKeys);
-        updateTopNumbers(data.topNumbers);
-        updateOverdueNumbers(data.overdueNumbers);
-        updateTrends(data);
-        createNumbersChart(data.numberFrequencies);
-        createStarsChart(data.starFrequencies);
+
+        if (!stored) {
+            const data = await response.json();
+            renderDashboard(data);
+            storeAnalysis(response.headers.get('X-Analysis-Version'), data);
+            return;
+        }
+
+        const delta = await response.json();
+        if (delta.full) {
+            renderDashboard(delta.analysis);
+        } else if (Object.keys(delta.changes).length > 0) {
+            currentData = stored.data;
+            applyAnalysisDiff(delta.changes);
+        } else if (currentData !== stored.data) {
+            renderDashboard(stored.data);
+        }
+        storeAnalysis(delta.version, currentData);
 
     } catch (error) {
         console.error('Erro ao carregar dados:', error);
+        if (!currentData) {
+            renderDashboard(getSimulatedData());
+        }
+    }
+}
+
+const UPDATE_POLL_INTERVAL = 1000;
+const UPDATE_MAX_WAIT = 300000;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
 
-        const simulatedData = getSimulatedData();
-        currentData = simulatedData;
-
-        updateStats(simulatedData);
-        updateLastResult(simulatedData);
-        updateStrategicKeys(simulatedData.strategicKeys);
-        updateTopNumbers(simulatedData.topNumbers);
-        updateOverdueNumbers(simulatedData.overdueNumbers);
-        updateTrends(simulatedData);
-        createNumbersChart(simulatedData.numberFrequencies);
-        createStarsChart(simulatedData.starFrequencies);
+async function waitForUpdateJob(jobId, onProgress) {
+    const deadline = Date.now() + UPDATE_MAX_WAIT;
+
+    while (Date.now() < deadline) {
+        const response = await fetchWithTimeout(`/api/update/${jobId}`, 10000);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        onProgress(job);
+
+        if (job.status !== 'pending' && job.status !== 'running') {
+            return job;
+        }
+        await sleep(UPDATE_POLL_INTERVAL);
     }
+    throw new Error('Tempo limite da atualização excedido');
+}
+
+const FREQUENCY_FIELDS = ['numberFrequencies', 'starFrequencies'];
+
+function applyAnalysisDiff(diff) {
+    // Diferença publicada pelo servidor: frequências como {índice: valor}, só as chaves alteradas
+    const data = { ...currentData };
+    Object.entries(diff).forEach(([field, value]) => {
+        if (FREQUENCY_FIELDS.includes(field) && Array.isArray(data[field])) {
+            data[field] = data[field].slice();
+            Object.entries(value).forEach(([index, frequency]) => { data[field][index] = frequency; });
+        } else if (field === 'strategicKeys') {
+            data.strategicKeys = { ...data.strategicKeys, ...value };
+        } else {
+            data[field] = value;
+        }
+    });
+    renderDashboard(data);
+}
+
+function streamUpdateJob(jobId, onProgress) {
+    // Progresso e diferenças da análise por Server-Sent Events; rejeita se o stream falhar
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/update/${jobId}/events`);
+        let analysisApplied = false;
+        const timeoutId = setTimeout(() => {
+            source.close();
+            reject(new Error('Tempo limite da atualização excedido'));
+        }, UPDATE_MAX_WAIT);
+
+        source.addEventListener('year', (event) => onProgress(JSON.parse(event.data)));
+        source.addEventListener('analysis', (event) => {
+            const { version, baseVersion, full, ...diff } = JSON.parse(event.data);
+            // O diff só é válido sobre a versão de que partiu; caso contrário pede-se o delta desde a guardada
+            const stored = readStoredAnalysis();
+            if (full || !currentData || !stored || stored.version !== baseVersion) {
+                loadDashboardData();
+            } else {
+                currentData = stored.data;
+                applyAnalysisDiff(diff);
+                storeAnalysis(version, currentData);
+            }
+            analysisApplied = true;
+        });
+        source.addEventListener('done', (event) => {
+            clearTimeout(timeoutId);
+            source.close();
+            resolve({ ...JSON.parse(event.data), analysisApplied });
+        });
+        source.onerror = () => {
+            clearTimeout(timeoutId);
+            source.close();
+            reject(new Error('Ligação de eventos interrompida'));
+        };
+    });
 }
 
 async function refreshData() {
     const btn = document.getElementById('refresh-btn');
+    const btnLabel = btn.querySelector('span:last-child');
+    const originalLabel = btnLabel.textContent;
     btn.classList.add('loading');
     btn.disabled = true;
 
@@ -122,10 +243,34 @@ async function refreshData() {
     trendCards.forEach(card => card.classList.add('updating'));
 
     try {
-        const response = await fetchWithTimeout('/api/update', 300000);
-        const result = await response.json();
+        const response = await fetchWithTimeout('/api/update', 10000, { method: 'POST' });
+        const accepted = await response.json();
+
+        if (!accepted.jobId) {
+            throw new Error(accepted.message || 'Falha ao iniciar a atualização');
+        }
+
+        const onProgress = (progress) => {
+            if (progress.yearsTotal > 1) {
+                btnLabel.textContent = `A atualizar ${progress.yearsDone}/${progress.yearsTotal}`;
+            }
+        };
+
+        let job = null;
+        if (window.EventSource) {
+            try {
+                job = await streamUpdateJob(accepted.jobId, onProgress);
+            } catch (error) {
+                console.warn('Eventos indisponíveis, a consultar o estado:', error);
+            }
+        }
+        if (!job) {
+            job = await waitForUpdateJob(accepted.jobId, onProgress);
+        }
 
-        if (result.status === 'success') {
+        if (job.status !== 'success') {
+            console.error('Erro ao atualizar:', job.message);
+        } else if (!job.analysisApplied) {
             await loadDashboardData();
         }
     } catch (error) {
@@ -133,6 +278,7 @@ async function refreshData() {
     } finally {
         btn.classList.remove('loading');
         btn.disabled = false;
+        btnLabel.textContent = originalLabel;
 
         keyCards.forEach(card => card.classList.remove('updating'));
 
@@ -0,0 +1,13 @@
+"""Ponto de entrada WSGI para produção, com vários workers a partilhar a análise em data/analysis.bin
+
+    gunicorn -w 4 -k gthread --threads 8 --timeout 120 -b 0.0.0.0:5001 wsgi:app
+
+Sem --preload: cada worker faz o seu pré-cálculo depois do fork, e só o primeiro calcula de facto.
+Workers gthread: cada stream /api/update/<id>/events ocupa uma thread, não o worker inteiro.
+"""
+from main import app, WARM_START, IMPORT_SECONDS, start_warmup
+from utils import log_info
+
+log_info(f"Imports do worker: {IMPORT_SECONDS * 1000:.0f} ms")
+if WARM_START:
+    start_warmup()